@@ -1,27 +1,67 @@
+import os
 from flask import Flask
-from flask_jwt_extended import JWTManager
-
+from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 
-from .db import db, init_sqlite_pragma
+from .db import db, init_sqlite_pragma, check_schema_version, database_url, REPLICA_BIND
+from .compression import init_compression
+from .maintenance import start_scheduler
+from .events import broker
+from .ratelimit import limiter
 from .routes import api_bp
 
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
-    # SQLite URL — file db in project root
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///dive_spot.db"
+    # SQLite file db by default; set DATABASE_URL=postgresql://... to use Postgres
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url(os.getenv("DATABASE_URL"))
+    # Optional read replica: GET/HEAD requests read from it, writes go to the primary
+    app.config["DATABASE_REPLICA_URL"] = os.getenv("DATABASE_REPLICA_URL")
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     app.config["JSON_SORT_KEYS"] = False
     app.config["JWT_SECRET_KEY"] = "super-secret"  # Change this in your production app!
+    # Live events: set a Redis URL to fan out across multiple workers
+    app.config["EVENTS_REDIS_URL"] = os.getenv("EVENTS_REDIS_URL")
+    # SSE streams each hold a request thread. Set WSGI_THREADS only when each worker has a
+    # fixed thread pool (gunicorn --threads, waitress): streams may then take at most half of
+    # it. Thread-per-request servers (run_server.py) and async workers don't need it.
+    app.config["WSGI_THREADS"] = int(os.getenv("WSGI_THREADS", "0")) or None
+    app.config["EVENTS_ASYNC_WORKERS"] = os.getenv("EVENTS_ASYNC_WORKERS", "0") == "1"
+    # "create_all" syncs the ORM schema on every boot; "migrations" only checks
+    # that `manage.py migrate` is up to date, which keeps worker spawn cheap
+    app.config["DB_STARTUP_MODE"] = os.getenv("DB_STARTUP_MODE", "create_all")
+    # Hand stats/counter updates to `manage.py worker` instead of doing them in the request
+    app.config["JOBS_ENABLED"] = os.getenv("JOBS_ENABLED", "0") == "1"
+    # Periodic ANALYZE/optimize/vacuum/archiving in a background thread; set in one process only
+    app.config["MAINTENANCE_INTERVAL_SECONDS"] = int(os.getenv("MAINTENANCE_INTERVAL_SECONDS", "0"))
+    app.config["ARCHIVE_LIKES_AFTER_DAYS"] = int(os.getenv("ARCHIVE_LIKES_AFTER_DAYS", "0")) or None
+    # Per-caller token buckets (shared across workers via Redis if set) and write shedding
+    app.config["RATELIMIT_ENABLED"] = os.getenv("RATELIMIT_ENABLED", "1") == "1"
+    app.config["RATELIMIT_REDIS_URL"] = os.getenv("RATELIMIT_REDIS_URL")
+    app.config["MAX_CONCURRENT_WRITES"] = int(os.getenv("MAX_CONCURRENT_WRITES", "4"))
+    # Number of reverse proxies (e.g. nginx) in front of the app whose X-Forwarded-For/-Proto
+    # to trust, so rate limits key on the real client address; 0 trusts none
+    app.config["TRUSTED_PROXIES"] = int(os.getenv("TRUSTED_PROXIES", "0"))
+
+    app.config.update(config or {})
+
+    if app.config["TRUSTED_PROXIES"]:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["TRUSTED_PROXIES"], x_proto=app.config["TRUSTED_PROXIES"])
+    if app.config["DATABASE_REPLICA_URL"]:
+        app.config.setdefault("SQLALCHEMY_BINDS", {})[REPLICA_BIND] = database_url(app.config["DATABASE_REPLICA_URL"])
+    if not app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        # server databases drop idle connections; check before handing one out
+        app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {"pool_pre_ping": True})
 
     # Enable CORS for all routes - completely open for development
     CORS(app, origins="*", supports_credentials=True)
-    app.config["JWT_SECRET_KEY"] = "super-secret"  # Change this in your production app!
 
     db.init_app(app)
     init_sqlite_pragma(app)
+    broker.init_app(app)
+    limiter.init_app(app)
+    init_compression(app)
 
     # Setup the Flask-JWT-Extended extension
     jwt = JWTManager(app)
@@ -29,7 +69,12 @@ def create_app():
 
     # Ensure tables are created
     with app.app_context():
-        db.create_all()
+        if app.config["DB_STARTUP_MODE"] == "migrations":
+            check_schema_version()
+        else:
+            db.create_all()
+
+    start_scheduler(app)
 
     # register blueprints
     app.register_blueprint(api_bp, url_prefix="/api")
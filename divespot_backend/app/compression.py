@@ -0,0 +1,88 @@
+import gzip
+import zlib
+from flask import Flask, request
+
+try:
+    import brotli  # optional: pip install Brotli
+except ImportError:
+    brotli = None
+
+# Only text payloads are worth it; images from /api/images are already compressed
+COMPRESSIBLE_MIMETYPES = {"application/json"}
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4  # dynamic responses: fast setting, still beats gzip -6 on our JSON
+
+
+def choose_encoding(accept_encodings, allow_brotli=True):
+    """Pick "br" or "gzip" from an Accept-Encoding header, or None."""
+    if allow_brotli and brotli is not None and accept_encodings.quality("br") > 0:
+        return "br"
+    if accept_encodings.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_stream(chunks, encoding: str):
+    """Compress an iterable of byte chunks as it is produced.
+
+    Each chunk is flushed, so the client can decode it as soon as it
+    arrives instead of waiting for the compressor's buffer to fill.
+    """
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            out = compressor.process(chunk) + compressor.flush()
+            if out:
+                yield out
+        yield compressor.finish()
+        return
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+    for chunk in chunks:
+        out = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def init_compression(app: Flask):
+    app.config.setdefault("COMPRESS_ENABLED", True)
+    app.config.setdefault("COMPRESS_MIN_SIZE", 1024)
+    app.config.setdefault("COMPRESS_BROTLI", True)
+
+    @app.after_request
+    def compress_response(response):
+        if not app.config["COMPRESS_ENABLED"]:
+            return response
+        if (
+            response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or response.status_code < 200
+            or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+        ):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = choose_encoding(request.accept_encodings, app.config["COMPRESS_BROTLI"])
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            # a generator body: compress as it is produced rather than buffering it all
+            body = response.response
+            response.response = compress_stream(response.iter_encoded(), encoding)
+            if hasattr(body, "close"):
+                response.call_on_close(body.close)
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+            if len(data) < app.config["COMPRESS_MIN_SIZE"]:
+                return response
+            response.set_data(compress(data, encoding))
+        response.headers["Content-Encoding"] = encoding
+        return response
@@ -0,0 +1,121 @@
+from datetime import date, timedelta
+from sqlalchemy import func, tuple_
+from .db import db
+from .models import DivePost, SpotConditionsDay
+
+# Categorical conditions are stored as score totals so a window is a plain SUM.
+# Higher visibility is better; higher current is stronger.
+VISIBILITY_SCORES = {"Very Poor": 0, "Poor": 1, "Fair": 2, "Good": 3, "Excellent": 4}
+CURRENT_SCORES = {"None": 0, "Light": 1, "Moderate": 2, "Strong": 3, "Very Strong": 4}
+WINDOWS = {"7d": 7, "30d": 30}
+BUCKETS = ("day",)
+
+_KEY_CHUNK = 500  # (spot, day) pairs per statement, well under SQLite's variable limit
+
+
+def window_start(window: str, today: date = None) -> date:
+    return (today or date.today()) - timedelta(days=WINDOWS[window] - 1)
+
+
+def _aggregate_posts(post_filter=None):
+    posts = DivePost.__table__
+    q = db.select(
+        posts.c.dive_spot_id,
+        posts.c.dive_date.label("day"),
+        func.count(posts.c.id).label("dives"),
+        func.sum(db.case(VISIBILITY_SCORES, value=posts.c.visibility_quality, else_=0)).label("visibility_total"),
+        func.sum(db.case(CURRENT_SCORES, value=posts.c.current_conditions, else_=0)).label("current_total"),
+        func.count(posts.c.water_temp).label("temp_dives"),
+        func.sum(posts.c.water_temp).label("temp_total"),
+        func.min(posts.c.water_temp).label("temp_min"),
+        func.max(posts.c.water_temp).label("temp_max"),
+    ).group_by(posts.c.dive_spot_id, posts.c.dive_date)
+    if post_filter is not None:
+        q = q.where(post_filter)
+    return [dict(row._mapping) for row in db.session.execute(q)]
+
+
+def refresh_days(keys):
+    """Recompute the rollup rows for the given (spot_id, dive_date) pairs from their posts.
+
+    Each pair is a handful of posts found via the dive_spot_id index, so this
+    is cheap on every post write. Pairs left with no posts lose their row.
+    The caller commits.
+    """
+    keys = list({(spot_id, day) for spot_id, day in keys if spot_id and day})
+    table = SpotConditionsDay.__table__
+    posts = DivePost.__table__
+    for i in range(0, len(keys), _KEY_CHUNK):
+        chunk = keys[i:i + _KEY_CHUNK]
+        db.session.execute(db.delete(table).where(tuple_(table.c.dive_spot_id, table.c.day).in_(chunk)))
+        rows = _aggregate_posts(tuple_(posts.c.dive_spot_id, posts.c.dive_date).in_(chunk))
+        if rows:
+            db.session.execute(db.insert(table), rows)
+
+
+def user_days(user_id: str):
+    """The (spot_id, dive_date) pairs a diver's posts contribute to; collect before deleting them."""
+    return db.session.query(DivePost.dive_spot_id, DivePost.dive_date).filter(DivePost.user_id == user_id).distinct().all()
+
+
+def _level(total, dives, scores):
+    if not dives:
+        return None
+    score = total / dives
+    labels = sorted(scores, key=scores.get)
+    return {"score": round(score, 2), "label": labels[int(score + 0.5)]}
+
+
+def _summary(row):
+    return {
+        "dives": row.dives,
+        "visibility": _level(row.visibility_total, row.dives, VISIBILITY_SCORES),
+        "current": _level(row.current_total, row.dives, CURRENT_SCORES),
+        "water_temp": {
+            "avg": round(row.temp_total / row.temp_dives, 1),
+            "min": row.temp_min,
+            "max": row.temp_max,
+        } if row.temp_dives else None,
+    }
+
+
+def daily(spot_id: str, start: date):
+    """One entry per day with dives at the spot since start, oldest first (a range scan on the primary key)."""
+    rows = (
+        SpotConditionsDay.query
+        .filter(SpotConditionsDay.dive_spot_id == spot_id, SpotConditionsDay.day >= start)
+        .order_by(SpotConditionsDay.day)
+        .all()
+    )
+    return [dict(_summary(r), date=r.day.isoformat()) for r in rows]
+
+
+def summaries(spot_ids, start: date):
+    """{spot_id: summary} over the window for every spot with dives in it, in one grouped query."""
+    t = SpotConditionsDay
+    rows = (
+        db.session.query(
+            t.dive_spot_id,
+            func.sum(t.dives).label("dives"),
+            func.sum(t.visibility_total).label("visibility_total"),
+            func.sum(t.current_total).label("current_total"),
+            func.sum(t.temp_dives).label("temp_dives"),
+            func.sum(t.temp_total).label("temp_total"),
+            func.min(t.temp_min).label("temp_min"),
+            func.max(t.temp_max).label("temp_max"),
+        )
+        .filter(t.dive_spot_id.in_(spot_ids), t.day >= start)
+        .group_by(t.dive_spot_id)
+        .all()
+    )
+    return {r.dive_spot_id: _summary(r) for r in rows}
+
+
+def rebuild():
+    """Recompute every rollup row from dive_posts in one pass."""
+    db.session.query(SpotConditionsDay).delete()
+    rows = _aggregate_posts()
+    if rows:
+        db.session.execute(db.insert(SpotConditionsDay.__table__), rows)
+    db.session.commit()
+    return len(rows)
@@ -1,20 +1,116 @@
+import math
+import os
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import event
-from sqlalchemy.engine import Engine
-from flask import Flask
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.sql.selectable import SelectBase
+from flask import Flask, g, has_request_context, request
 
-db = SQLAlchemy()
+DEFAULT_DATABASE_URL = "sqlite:///dive_spot.db"
+# where Flask-SQLAlchemy puts relative SQLite paths (the app's instance folder)
+INSTANCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instance")
+REPLICA_BIND = "replica"
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def database_url(url: str = None) -> str:
+    """Normalise a DATABASE_URL (Heroku-style postgres:// isn't accepted by SQLAlchemy 2)."""
+    url = url or DEFAULT_DATABASE_URL
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def sqlite_path(url: str) -> str:
+    """The file behind a SQLite URL, resolved the way the app resolves it.
+
+    Relative paths live in the instance folder, not the current directory, so
+    `manage.py` and the API always open the same database.
+    """
+    path = make_url(url).database
+    if not path or path == ":memory:" or os.path.isabs(path):
+        return path
+    return os.path.join(INSTANCE_DIR, path)
+
+
+def use_primary():
+    """Send the rest of this request's queries to the primary (read-your-writes)."""
+    g.db_use_primary = True
+
+
+class RoutingSession(Session):
+    """Reads from safe (GET/HEAD) requests go to the replica bind, everything else to the primary.
+
+    Only SELECTs are read from the replica. Flushes and anything else
+    (core insert/update/delete, text(), bare connection() calls) go to the
+    primary, and once a safe request has written, the rest of it reads from
+    the primary too. Outside a request (CLI, job workers, scheduler) every
+    query uses the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _reads_from_replica():
+            if not self._flushing and isinstance(clause, SelectBase):
+                replica = self._db.engines.get(REPLICA_BIND)
+                if replica is not None:
+                    return replica
+            else:
+                use_primary()
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _reads_from_replica():
+    return has_request_context() and request.method in READ_METHODS and not g.get("db_use_primary")
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+# Applied in order by `manage.py migrate` and recorded in the _migrations table
+MIGRATIONS = [
+    "migrations/001_initial.sql",
+    "migrations/002_seed_spots.sql",
+    "migrations/003_hot_score.sql",
+    "migrations/004_leaderboards.sql",
+    "migrations/005_jobs.sql",
+    "migrations/006_idempotency_keys.sql",
+    "migrations/007_post_likes_archive.sql",
+    "migrations/008_spot_conditions_daily.sql",
+    "migrations/009_idempotency_claimed_at.sql",
+]
+
+# Postgres variants live next to them, under the same file names
+POSTGRES_MIGRATIONS_DIR = "migrations/postgres"
 
 # Ensure FK constraints are enforced in SQLite
 @event.listens_for(Engine, "connect")
 def set_sqlite_pragma(dbapi_connection, connection_record):
-    try:
-        cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA foreign_keys=ON")
-        cursor.close()
-    except Exception:
-        pass
+    # a failed PRAGMA would leave a Postgres connection in an aborted transaction
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+    # models.log2 (hot_score updates); not every SQLite build has the math functions
+    dbapi_connection.create_function("log2", 1, math.log2, deterministic=True)
 
 def init_sqlite_pragma(app: Flask):
     # nothing extra; kept for symmetry/clarity
     pass
+
+def check_schema_version():
+    """Fail fast unless every migration is recorded in _migrations.
+
+    A single indexed read, used at boot instead of create_all() so worker
+    spawn doesn't pay for reflection and DDL checks.
+    """
+    try:
+        with db.engine.connect() as conn:
+            applied = {row[0] for row in conn.execute(text("SELECT filename FROM _migrations"))}
+    except DBAPIError:
+        applied = set()
+    missing = [m for m in MIGRATIONS if m not in applied]
+    if missing:
+        raise RuntimeError(f"database schema is out of date, run `python manage.py migrate` (missing: {', '.join(missing)})")
@@ -0,0 +1,278 @@
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from flask import Flask
+
+logger = logging.getLogger(__name__)
+
+
+class EventBackend:
+    """Transport between publishers and the subscribers held by this process.
+
+    The in-process backend delivers directly; a shared backend (e.g. Redis)
+    fans events out to every worker, each of which hands them to ``deliver``.
+    """
+
+    def __init__(self):
+        self.ids = itertools.count(1)
+        self.id_lock = threading.Lock()
+
+    def start(self, deliver):
+        self.deliver = deliver
+
+    def next_id(self) -> int:
+        with self.id_lock:
+            return next(self.ids)
+
+    def publish(self, channel: str, message: dict):
+        self.deliver(channel, message)
+
+
+class RedisEventBackend(EventBackend):
+    """Fan events out across workers through Redis pub/sub."""
+
+    reconnect_delay = 0.5
+    max_reconnect_delay = 30
+
+    def __init__(self, url: str, prefix: str = "divespot:events:"):
+        import redis  # optional dependency, only needed for multi-worker setups
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.id_key = f"{prefix}__next_id"
+
+    def start(self, deliver):
+        super().start(deliver)
+        thread = threading.Thread(target=self._listen, daemon=True)
+        thread.start()
+
+    def _listen(self):
+        # the thread must outlive Redis restarts and dropped connections, or
+        # this worker silently stops hearing events until it is restarted;
+        # events published while disconnected are lost
+        delay = self.reconnect_delay
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.psubscribe(f"{self.prefix}*")
+                delay = self.reconnect_delay
+                for item in pubsub.listen():
+                    try:
+                        channel = item["channel"].decode()[len(self.prefix):]
+                        self.deliver(channel, json.loads(item["data"]))
+                    except Exception:
+                        continue
+            except Exception:
+                logger.exception("lost the Redis event subscription; reconnecting in %.1fs", delay)
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def next_id(self) -> int:
+        # one sequence for every worker, so Last-Event-ID means the same thing on all of them
+        return self.client.incr(self.id_key)
+
+    def publish(self, channel: str, message: dict):
+        self.client.publish(f"{self.prefix}{channel}", json.dumps(message))
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscription:
+    def __init__(self, broker, channels, max_queue):
+        self.broker = broker
+        self.channels = channels
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = False
+
+    def push(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            # slow consumer — close it rather than buffer without bound
+            self.dropped = True
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class EventBroker:
+    """In-process pub/sub for live post activity, served to clients over SSE."""
+
+    def __init__(self):
+        self.backend = None
+        self.redis_url = None
+        self.started = False
+        self.lock = threading.Lock()
+        self.subscribers = {}
+        # channel -> recent messages, least recently active channel first
+        self.history = OrderedDict()
+        self.connections = 0
+        self.max_connections = 200
+        self.max_per_channel = 50
+        self.heartbeat_interval = 15
+        self.max_stream_seconds = 300
+        self.retry_ms = 3000
+        self.history_size = 100
+        self.history_channels = 1000
+        self.history_ttl = 600  # replay only matters for reconnects, which come within seconds
+        self.queue_size = 100
+        self.warned_full = False
+
+    def init_app(self, app: Flask, backend: EventBackend = None):
+        # every open stream holds a request thread for up to max_stream_seconds,
+        # so with a fixed thread pool streams may only take half of it; a
+        # thread-per-request server or async workers (gevent/eventlet) have no pool to exhaust
+        threads = app.config.get("WSGI_THREADS")
+        if threads and not app.config.get("EVENTS_ASYNC_WORKERS"):
+            default_connections = max(1, threads // 2)
+        else:
+            default_connections = 200
+        self.max_connections = app.config.get("EVENTS_MAX_CONNECTIONS") or default_connections
+        self.max_per_channel = min(app.config.get("EVENTS_MAX_PER_CHANNEL", 50), self.max_connections)
+        self.heartbeat_interval = app.config.get("EVENTS_HEARTBEAT_SECONDS", self.heartbeat_interval)
+        self.max_stream_seconds = app.config.get("EVENTS_MAX_STREAM_SECONDS", self.max_stream_seconds)
+        self.redis_url = app.config.get("EVENTS_REDIS_URL")
+        # the backend (and any Redis connection) is only started on first use
+        self.backend = backend
+        self.started = False
+        app.extensions["events"] = self
+
+    def _ensure_started(self):
+        if self.started:
+            return
+        with self.lock:
+            if self.started:
+                return
+            if self.backend is None:
+                self.backend = RedisEventBackend(self.redis_url) if self.redis_url else EventBackend()
+            self.backend.start(self._deliver)
+            self.started = True
+
+    def publish(self, channel: str, event: str, data: dict):
+        self._ensure_started()
+        # the id travels with the message, so every worker replays the same numbering
+        self.backend.publish(channel, {"id": self.backend.next_id(), "event": event, "data": data})
+
+    def _deliver(self, channel: str, message: dict):
+        now = time.monotonic()
+        with self.lock:
+            history = self.history.pop(channel, None) or deque(maxlen=self.history_size)
+            history.append(dict(message, at=now))
+            self.history[channel] = history
+            self._evict_history(now)
+            targets = list(self.subscribers.get(channel, ()))
+        for sub in targets:
+            sub.push(message)
+
+    def _evict_history(self, now):
+        # oldest-activity first: drop channels over the cap or idle past the TTL
+        while self.history:
+            channel, history = next(iter(self.history.items()))
+            if len(self.history) <= self.history_channels and now - history[-1]["at"] < self.history_ttl:
+                break
+            del self.history[channel]
+
+    def subscribe(self, channels, last_event_id=None):
+        self._ensure_started()
+        with self.lock:
+            if self.connections >= self.max_connections:
+                if not self.warned_full:
+                    self.warned_full = True
+                    logger.warning(
+                        "all %d event streams on this worker are taken; more streams need more thread-pool "
+                        "threads (WSGI_THREADS) or async workers (EVENTS_ASYNC_WORKERS=1 with gunicorn -k gevent)",
+                        self.max_connections,
+                    )
+                raise TooManySubscribers()
+            for channel in channels:
+                # the feed stream is shared by everyone, so only the global cap applies
+                limit = self.max_connections if channel == FEED_CHANNEL else self.max_per_channel
+                if len(self.subscribers.get(channel, ())) >= limit:
+                    raise TooManySubscribers()
+            sub = Subscription(self, channels, self.queue_size)
+            for channel in channels:
+                self.subscribers.setdefault(channel, set()).add(sub)
+            self.connections += 1
+            if last_event_id is not None:
+                # replay what the client missed while reconnecting
+                missed = [
+                    m for channel in channels for m in self.history.get(channel, ())
+                    if m["id"] > last_event_id
+                ]
+                for message in sorted(missed, key=lambda m: m["id"]):
+                    sub.push(message)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self.lock:
+            removed = False
+            for channel in sub.channels:
+                subs = self.subscribers.get(channel)
+                if subs and sub in subs:
+                    subs.discard(sub)
+                    removed = True
+                    if not subs:
+                        del self.subscribers[channel]
+            if removed:
+                self.connections -= 1
+
+    def stream(self, sub: Subscription):
+        """Yield SSE frames until the stream's lifetime runs out.
+
+        Streams are capped at ``max_stream_seconds`` so an idle client cannot
+        hold a WSGI worker thread forever; the ``retry`` hint plus
+        ``Last-Event-ID`` let the client reconnect without losing events.
+        """
+        deadline = time.monotonic() + self.max_stream_seconds
+        try:
+            yield f"retry: {self.retry_ms}\n\n"
+            while not sub.dropped:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                message = sub.get(timeout=min(self.heartbeat_interval, remaining))
+                if message is None:
+                    # heartbeat keeps proxies from closing the connection and
+                    # surfaces dead clients as a write error
+                    yield ": ping\n\n"
+                    continue
+                yield (
+                    f"id: {message['id']}\n"
+                    f"event: {message['event']}\n"
+                    f"data: {json.dumps(message['data'])}\n\n"
+                )
+        finally:
+            sub.close()
+
+
+broker = EventBroker()
+
+FEED_CHANNEL = "feed"
+
+
+def post_channel(post_id: str) -> str:
+    return f"post:{post_id}"
+
+
+def publish_post_event(post_id: str, event: str, data: dict):
+    """Publish activity on a post to its own stream and to the feed stream."""
+    payload = dict(data, post_id=post_id)
+    broker.publish(post_channel(post_id), event, payload)
+    broker.publish(FEED_CHANNEL, event, payload)
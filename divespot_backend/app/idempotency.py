@@ -0,0 +1,130 @@
+import hashlib
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import current_app, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from .db import db
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+# a claimed key with no response after this long belongs to a request that died
+CLAIM_LEASE_SECONDS = 60
+
+
+def _fingerprint():
+    digest = hashlib.sha256()
+    digest.update(f"{request.method} {request.path}\n".encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()[:32]
+
+
+def _replay(record):
+    response = current_app.response_class(record.response_body, status=record.status_code, mimetype="application/json")
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(view):
+    """Make a write route safe to retry with an Idempotency-Key header.
+
+    The first request with a key records its response; a retry with the same
+    key gets that response back after one primary-key lookup, without running
+    the view or touching any other table. Keys are scoped to the caller's JWT
+    identity and expire after IDEMPOTENCY_TTL_SECONDS. Requests without the
+    header behave as before. If the worker running the original request is
+    killed, a retry takes the key over once IDEMPOTENCY_LEASE_SECONDS have
+    passed since it was claimed, instead of getting 409 until it expires.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return {"error": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters"}, 400
+
+        try:
+            scope = get_jwt_identity() or "anon"
+        except RuntimeError:
+            # route without jwt_required
+            scope = "anon"
+        fingerprint = _fingerprint()
+        now = datetime.utcnow()
+        record = db.session.get(IdempotencyKey, (scope, key))
+        if record is not None and record.expires_at <= now:
+            db.session.delete(record)
+            db.session.commit()
+            record = None
+        if record is not None:
+            if record.fingerprint != fingerprint:
+                return {"error": f"{HEADER} was already used for a different request"}, 422
+            if record.status_code is not None:
+                return _replay(record)
+            if not _take_over(scope, key, now):
+                return {"error": "a request with this key is still in progress"}, 409, {"Retry-After": "1"}
+        else:
+            # claim the key first so a concurrent retry sees it as in progress
+            ttl = current_app.config.get("IDEMPOTENCY_TTL_SECONDS", 24 * 3600)
+            db.session.add(IdempotencyKey(
+                scope=scope, key=key, fingerprint=fingerprint, claimed_at=now, expires_at=now + timedelta(seconds=ttl),
+            ))
+            try:
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                return {"error": "a request with this key is still in progress"}, 409, {"Retry-After": "1"}
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            db.session.rollback()
+            _release(scope, key)
+            raise
+        if response.status_code >= 500:
+            # server-side failure: let the client retry for real
+            _release(scope, key)
+        else:
+            db.session.query(IdempotencyKey).filter_by(scope=scope, key=key).update({
+                IdempotencyKey.status_code: response.status_code,
+                IdempotencyKey.response_body: response.get_data(as_text=True),
+            })
+            db.session.commit()
+        return response
+    return wrapper
+
+
+def _take_over(scope, key, now):
+    """Re-claim a key whose request stopped without answering; True if this request got it.
+
+    Conditional, so of several retries racing for an abandoned key only one wins.
+    """
+    lease = current_app.config.get("IDEMPOTENCY_LEASE_SECONDS", CLAIM_LEASE_SECONDS)
+    cutoff = now - timedelta(seconds=lease)
+    taken = (
+        db.session.query(IdempotencyKey)
+        .filter(
+            IdempotencyKey.scope == scope,
+            IdempotencyKey.key == key,
+            IdempotencyKey.status_code.is_(None),
+            # NULL: claimed before claimed_at existed
+            or_(IdempotencyKey.claimed_at.is_(None), IdempotencyKey.claimed_at < cutoff),
+        )
+        .update({IdempotencyKey.claimed_at: now}, synchronize_session=False)
+    )
+    db.session.commit()
+    return taken == 1
+
+
+def _release(scope, key):
+    db.session.query(IdempotencyKey).filter_by(scope=scope, key=key).delete()
+    db.session.commit()
+
+
+def purge_expired_keys():
+    """Delete expired keys; returns how many were removed."""
+    count = db.session.query(IdempotencyKey).filter(IdempotencyKey.expires_at <= datetime.utcnow()).delete()
+    db.session.commit()
+    return count
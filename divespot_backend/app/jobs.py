@@ -0,0 +1,183 @@
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_
+from flask import Flask, current_app
+from .db import db
+from .models import Job, DivePost, recalc_post_counts, recalc_user_stats, recalc_spot_totals
+from . import leaderboards, conditions
+from .events import publish_post_event
+
+# Jobs live in the same database as the data they touch. Enqueueing inside the
+# request's transaction means a job exists iff the write committed, and a
+# handler's changes commit together with the job's removal, so a crash at any
+# point either leaves the job to be retried or leaves it done — never half-run.
+# Handlers must still be idempotent: they recompute rather than increment.
+# A handler that announces its result returns the (post_id, event, data)
+# events instead of publishing them, so listeners only hear about committed
+# state. They go out after the commit; the job is done by then, so a failed
+# publish is logged and not retried.
+
+HANDLERS = {}
+
+LEASE_SECONDS = 60        # a running job not finished within this is presumed orphaned
+POLL_INTERVAL = 0.5
+MAX_BACKOFF_SECONDS = 300
+
+
+def job(kind: str):
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def enqueue(kind: str, payload: dict = None, delay: float = 0, max_attempts: int = 5):
+    """Add a job to the current session; it becomes visible when the caller commits."""
+    j = Job(
+        kind=kind,
+        payload=payload or {},
+        max_attempts=max_attempts,
+        run_after=datetime.utcnow() + timedelta(seconds=delay),
+    )
+    db.session.add(j)
+    return j
+
+
+def _claimable(now, lease):
+    return or_(
+        and_(Job.status == "queued", Job.run_after <= now),
+        # a worker died holding it
+        and_(Job.status == "running", Job.locked_at < now - timedelta(seconds=lease)),
+    )
+
+
+def claim(worker_id: str, lease: float = LEASE_SECONDS):
+    """Atomically take the next due job, or return None."""
+    now = datetime.utcnow()
+    job_id = (
+        db.session.query(Job.id)
+        .filter(_claimable(now, lease))
+        .order_by(Job.run_after)
+        .limit(1)
+        .scalar()
+    )
+    if job_id is None:
+        db.session.rollback()
+        return None
+    # compare-and-set: only one worker's UPDATE matches
+    claimed = (
+        db.session.query(Job)
+        .filter(Job.id == job_id, _claimable(now, lease))
+        .update(
+            {Job.status: "running", Job.locked_by: worker_id, Job.locked_at: now, Job.attempts: Job.attempts + 1},
+            synchronize_session=False,
+        )
+    )
+    db.session.commit()
+    return db.session.get(Job, job_id) if claimed else None
+
+
+def run_job(j: Job):
+    if j.attempts > j.max_attempts:
+        # crashed the worker on every attempt
+        j.status = "dead"
+        j.last_error = j.last_error or "worker lost the job too many times"
+        db.session.commit()
+        return
+    try:
+        handler = HANDLERS.get(j.kind)
+        if handler is None:
+            raise LookupError(f"no handler for job kind {j.kind!r}")
+        events = handler(j.payload or {}) or ()
+        db.session.delete(j)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        error = traceback.format_exc(limit=5)
+        j = db.session.get(Job, j.id)
+        j.last_error = error
+        if j.attempts >= j.max_attempts:
+            j.status = "dead"
+        else:
+            j.status = "queued"
+            j.run_after = datetime.utcnow() + timedelta(seconds=min(2 ** j.attempts, MAX_BACKOFF_SECONDS))
+        j.locked_by = None
+        j.locked_at = None
+        db.session.commit()
+        return
+    for post_id, event, data in events:
+        try:
+            publish_post_event(post_id, event, data)
+        except Exception:
+            current_app.logger.exception("publishing %s for post %s failed", event, post_id)
+
+
+def work(app: Flask, worker_id: str, stop: threading.Event, lease: float = LEASE_SECONDS, poll_interval: float = POLL_INTERVAL):
+    """Process jobs until stop is set; one app context (and so one DB session) per thread."""
+    with app.app_context():
+        while not stop.is_set():
+            try:
+                j = claim(worker_id, lease)
+            except Exception:
+                db.session.rollback()
+                j = None
+            if j is None:
+                stop.wait(poll_interval)
+                continue
+            job_id, kind = j.id, j.kind
+            try:
+                run_job(j)
+            except Exception:
+                # e.g. "database is locked" while recording a failure; the
+                # lease expires and the job is claimed again, so keep the thread
+                db.session.rollback()
+                app.logger.exception("job %s (%s) could not be recorded", job_id, kind)
+        db.session.remove()
+
+
+def run_workers(app: Flask, threads: int = 2, lease: float = LEASE_SECONDS, poll_interval: float = POLL_INTERVAL):
+    """Run worker threads until interrupted (manage.py worker)."""
+    stop = threading.Event()
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    pool = [
+        threading.Thread(target=work, args=(app, f"{prefix}:{i}", stop, lease, poll_interval), daemon=True)
+        for i in range(threads)
+    ]
+    for t in pool:
+        t.start()
+    try:
+        while any(t.is_alive() for t in pool):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        stop.set()
+        for t in pool:
+            t.join()
+
+
+# ----------- handlers -----------
+
+@job("post_created")
+def post_created(payload):
+    post = db.session.get(DivePost, payload["post_id"])
+    if post is None:
+        return
+    recalc_user_stats([post.user_id])
+    recalc_spot_totals([post.dive_spot_id])
+    leaderboards.refresh_entries(post.user_id, post.dive_spot_id, post.dive_date)
+    conditions.refresh_days([(post.dive_spot_id, post.dive_date)])
+
+
+@job("post_counts")
+def post_counts(payload):
+    post_id = payload["post_id"]
+    likes_count, comments_count = recalc_post_counts(post_id, commit=False)
+    event = payload.get("event")
+    if event in ("like", "unlike"):
+        return [(post_id, event, {"user_id": payload.get("user_id"), "likes_count": likes_count})]
+    if event == "comment":
+        return [(post_id, event, {"comment": payload.get("comment"), "comments_count": comments_count})]
+    return None
@@ -0,0 +1,123 @@
+from collections import defaultdict
+from datetime import date
+from sqlalchemy import func
+from .db import db
+from .models import User, DivePost, LeaderboardEntry
+
+# "deepest" ranks by the deepest logged dive, "dives" by the number of dives logged
+BOARDS = ("deepest", "dives")
+GLOBAL = "global"
+ALL_TIME = "all"
+
+
+def month_key(d: date) -> str:
+    return d.strftime("%Y-%m")
+
+
+def _month_bounds(period: str):
+    start = date(int(period[:4]), int(period[5:7]), 1)
+    end = date(start.year + (start.month == 12), start.month % 12 + 1, 1)
+    return start, end
+
+
+def _aggregate(user_id, scope, period):
+    q = db.session.query(func.count(DivePost.id), func.max(DivePost.max_depth)).filter(DivePost.user_id == user_id)
+    if scope != GLOBAL:
+        q = q.filter(DivePost.dive_spot_id == scope)
+    if period != ALL_TIME:
+        start, end = _month_bounds(period)
+        q = q.filter(DivePost.dive_date >= start, DivePost.dive_date < end)
+    count, deepest = q.one()
+    return {"dives": count or 0, "deepest": deepest or 0}
+
+
+def _set_entry(board, scope, period, user_id, value):
+    entry = db.session.get(LeaderboardEntry, (board, scope, period, user_id))
+    if value <= 0:
+        if entry is not None:
+            db.session.delete(entry)
+    elif entry is None:
+        db.session.add(LeaderboardEntry(board=board, scope=scope, period=period, user_id=user_id, value=value))
+    else:
+        entry.value = value
+
+
+def refresh_entries(user_id: str, spot_id: str, dive_date: date):
+    """Recompute the diver's rows on every board a post at spot_id on dive_date counts towards.
+
+    Only that diver's posts are aggregated (via the user_id index), so this
+    stays cheap however many posts and divers there are. The caller commits.
+    """
+    for scope in (GLOBAL, spot_id):
+        for period in (ALL_TIME, month_key(dive_date)):
+            values = _aggregate(user_id, scope, period)
+            for board in BOARDS:
+                _set_entry(board, scope, period, user_id, values[board])
+
+
+def drop_spot(spot_id: str, author_ids):
+    """Remove a deleted spot's boards and rebuild the rows of the divers who posted there.
+
+    Call after the spot's posts are gone. The caller commits.
+    """
+    db.session.query(LeaderboardEntry).filter(LeaderboardEntry.scope == spot_id).delete()
+    if author_ids:
+        db.session.query(LeaderboardEntry).filter(LeaderboardEntry.user_id.in_(author_ids)).delete()
+        _insert_aggregates(DivePost.user_id.in_(author_ids))
+
+
+def top(board: str, scope: str, period: str, limit: int, offset: int = 0):
+    rows = (
+        db.session.query(LeaderboardEntry.user_id, LeaderboardEntry.value, User.username, User.display_name, User.profile_image_url)
+        .join(User, User.id == LeaderboardEntry.user_id)
+        .filter(LeaderboardEntry.board == board, LeaderboardEntry.scope == scope, LeaderboardEntry.period == period)
+        .order_by(LeaderboardEntry.value.desc(), LeaderboardEntry.user_id)
+        .limit(limit)
+        .offset(offset)
+        .all()
+    )
+    return rows
+
+
+def rank_of(board: str, scope: str, period: str, user_id: str):
+    """(rank, value) for a diver, or None if they aren't on the board.
+
+    Rank is 1 + the number of divers with a strictly higher value (ties share
+    a rank), counted on the ix_leaderboard_rank index.
+    """
+    key = (LeaderboardEntry.board == board, LeaderboardEntry.scope == scope, LeaderboardEntry.period == period)
+    value = db.session.query(LeaderboardEntry.value).filter(*key, LeaderboardEntry.user_id == user_id).scalar()
+    if value is None:
+        return None
+    ahead = db.session.query(func.count()).select_from(LeaderboardEntry).filter(*key, LeaderboardEntry.value > value).scalar()
+    return ahead + 1, value
+
+
+def _insert_aggregates(post_filter=None):
+    totals = defaultdict(lambda: {"dives": 0, "deepest": 0})
+    q = db.session.query(DivePost.user_id, DivePost.dive_spot_id, DivePost.dive_date, DivePost.max_depth)
+    if post_filter is not None:
+        q = q.filter(post_filter)
+    for user_id, spot_id, dive_date, depth in q.yield_per(5000):
+        for scope in (GLOBAL, spot_id):
+            for period in (ALL_TIME, month_key(dive_date)):
+                t = totals[(scope, period, user_id)]
+                t["dives"] += 1
+                t["deepest"] = max(t["deepest"], depth or 0)
+    rows = [
+        {"board": board, "scope": scope, "period": period, "user_id": user_id, "value": t[board]}
+        for (scope, period, user_id), t in totals.items()
+        for board in BOARDS
+        if t[board] > 0
+    ]
+    if rows:
+        db.session.execute(db.insert(LeaderboardEntry.__table__), rows)
+    return len(rows)
+
+
+def rebuild():
+    """Recompute every board from dive_posts in one pass."""
+    db.session.query(LeaderboardEntry).delete()
+    count = _insert_aggregates()
+    db.session.commit()
+    return count
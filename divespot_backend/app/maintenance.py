@@ -0,0 +1,147 @@
+import os
+import threading
+from datetime import datetime, timedelta
+from flask import Flask
+from sqlalchemy import text
+from .db import db
+from .models import PostLike, PostLikeArchive
+from .idempotency import purge_expired_keys
+
+# Queries whose plans are worth watching before/after ANALYZE
+PLAN_QUERIES = {
+    "feed": "SELECT id FROM dive_posts ORDER BY created_at DESC LIMIT 20",
+    "hot feed": "SELECT id FROM dive_posts ORDER BY hot_score DESC LIMIT 20",
+    "user posts": "SELECT id FROM dive_posts WHERE user_id = 'x' ORDER BY created_at DESC LIMIT 20",
+    "post likes": "SELECT id FROM post_likes WHERE post_id = 'x' ORDER BY created_at DESC LIMIT 20",
+    "leaderboard": "SELECT user_id FROM leaderboard_entries WHERE board = 'dives' AND scope = 'global' AND period = 'all' ORDER BY value DESC LIMIT 10",
+}
+
+
+def _pragma(conn, statement):
+    result = conn.execute(text(f"PRAGMA {statement}"))
+    return result.fetchall() if result.returns_rows else []
+
+
+def db_size(conn):
+    page_size = _pragma(conn, "page_size")[0][0]
+    pages = _pragma(conn, "page_count")[0][0]
+    free = _pragma(conn, "freelist_count")[0][0]
+    path = conn.engine.url.database
+    wal = f"{path}-wal" if path else None
+    return {
+        "bytes": pages * page_size,
+        "free_bytes": free * page_size,
+        "wal_bytes": os.path.getsize(wal) if wal and os.path.exists(wal) else 0,
+    }
+
+
+def query_plans(conn):
+    plans = {}
+    for name, sql in PLAN_QUERIES.items():
+        try:
+            rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+            plans[name] = "; ".join(row[-1] for row in rows)
+        except Exception as e:
+            plans[name] = f"n/a ({e.__class__.__name__})"
+    return plans
+
+
+def archive_likes(older_than_days: int, batch_size: int = 5000):
+    """Move likes older than the cutoff into post_likes_archive.
+
+    likes_count already includes them and recalc_post_counts counts both
+    tables, so counters don't move. Returns the number of rows archived.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    likes = PostLike.__table__
+    archive = PostLikeArchive.__table__
+    moved = 0
+    while True:
+        ids = [row[0] for row in db.session.execute(
+            db.select(likes.c.id).where(likes.c.created_at < cutoff).limit(batch_size)
+        )]
+        if not ids:
+            break
+        db.session.execute(
+            archive.insert().prefix_with("OR IGNORE").from_select(
+                ["post_id", "user_id", "created_at"],
+                db.select(likes.c.post_id, likes.c.user_id, likes.c.created_at).where(likes.c.id.in_(ids)),
+            )
+        )
+        db.session.execute(db.delete(likes).where(likes.c.id.in_(ids)))
+        db.session.commit()
+        moved += len(ids)
+    return moved
+
+
+def maintain(archive_likes_days: int = None, vacuum_pages: int = 0, full_vacuum: bool = False, log=print):
+    """Run one maintenance pass on the SQLite database and report what changed."""
+    if db.engine.dialect.name != "sqlite":
+        log("maintain: only SQLite needs this; skipping")
+        return
+
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        before_size, before_plans = db_size(conn), query_plans(conn)
+
+        if archive_likes_days is not None:
+            log(f"archived {archive_likes(archive_likes_days)} likes older than {archive_likes_days} days")
+        log(f"purged {purge_expired_keys()} expired idempotency keys")
+        db.session.remove()
+
+        conn.execute(text("ANALYZE"))
+        _pragma(conn, "optimize")
+        log("ANALYZE + PRAGMA optimize done")
+
+        if full_vacuum:
+            # switching auto_vacuum only takes effect through a full VACUUM
+            _pragma(conn, "auto_vacuum = INCREMENTAL")
+            conn.execute(text("VACUUM"))
+            log("VACUUM done (auto_vacuum=INCREMENTAL from now on)")
+        elif _pragma(conn, "auto_vacuum")[0][0] == 2:
+            _pragma(conn, f"incremental_vacuum({vacuum_pages})" if vacuum_pages else "incremental_vacuum")
+            log("incremental vacuum done")
+        else:
+            log("auto_vacuum is not INCREMENTAL; run once with --full-vacuum to enable incremental vacuum")
+
+        if _pragma(conn, "journal_mode")[0][0] == "wal":
+            busy, log_frames, checkpointed = _pragma(conn, "wal_checkpoint(TRUNCATE)")[0]
+            log(f"WAL checkpoint: {checkpointed}/{log_frames} frames{' (busy)' if busy else ''}")
+
+        after_size, after_plans = db_size(conn), query_plans(conn)
+
+    log("")
+    for field in ("bytes", "free_bytes", "wal_bytes"):
+        log(f"{field:>10}: {before_size[field]:>12,} -> {after_size[field]:>12,}")
+    for name in PLAN_QUERIES:
+        marker = "  " if before_plans[name] == after_plans[name] else "* "
+        log(f"{marker}{name}: {before_plans[name]}")
+        if marker == "* ":
+            log(f"  {' ' * len(name)}  -> {after_plans[name]}")
+
+
+def start_scheduler(app: Flask):
+    """Run light maintenance every MAINTENANCE_INTERVAL_SECONDS in a daemon thread.
+
+    Enable it in one process only (e.g. the job worker), not in every web worker.
+    """
+    interval = app.config.get("MAINTENANCE_INTERVAL_SECONDS")
+    if not interval:
+        return None
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            with app.app_context():
+                try:
+                    maintain(
+                        archive_likes_days=app.config.get("ARCHIVE_LIKES_AFTER_DAYS"),
+                        vacuum_pages=app.config.get("MAINTENANCE_VACUUM_PAGES", 1000),
+                        log=app.logger.info,
+                    )
+                except Exception:
+                    app.logger.exception("scheduled maintenance failed")
+                finally:
+                    db.session.remove()
+
+    threading.Thread(target=loop, name="db-maintenance", daemon=True).start()
+    return stop
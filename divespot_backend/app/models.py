@@ -1,13 +1,19 @@
+import math
 import uuid
 from datetime import datetime
-from sqlalchemy.dialects.sqlite import JSON
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy import CheckConstraint, func
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
 from .db import db
 from werkzeug.security import generate_password_hash, check_password_hash
 
 def gen_uuid():
     return str(uuid.uuid4())
 
+# JSON text on SQLite, JSONB on Postgres (lists like sea_life can take a GIN index there)
+JSON = db.JSON().with_variant(JSONB(), "postgresql")
+
 class User(db.Model):
     __tablename__ = "users"
     id = db.Column(db.String(36), primary_key=True, default=gen_uuid)
@@ -31,9 +37,10 @@ class User(db.Model):
     password_hash = db.Column(db.Text)
     email_verified = db.Column(db.Boolean, default=False)
 
-    posts = db.relationship("DivePost", backref="user", cascade="all, delete-orphan")
-    likes = db.relationship("PostLike", backref="user", cascade="all, delete-orphan")
-    comments = db.relationship("PostComment", backref="user", cascade="all, delete-orphan")
+    # children are removed by ON DELETE CASCADE; passive_deletes keeps the ORM from loading them
+    posts = db.relationship("DivePost", backref="user", cascade="all, delete-orphan", passive_deletes=True)
+    likes = db.relationship("PostLike", backref="user", cascade="all, delete-orphan", passive_deletes=True)
+    comments = db.relationship("PostComment", backref="user", cascade="all, delete-orphan", passive_deletes=True)
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -96,13 +103,14 @@ class DivePost(db.Model):
 
     likes_count = db.Column(db.Integer, default=0)
     comments_count = db.Column(db.Integer, default=0)
+    hot_score = db.Column(db.Float, default=0.0, index=True)  # see hot_score()
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     dive_timestamp = db.Column(db.DateTime, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    likes = db.relationship("PostLike", backref="post", cascade="all, delete-orphan")
-    comments = db.relationship("PostComment", backref="post", cascade="all, delete-orphan")
+    likes = db.relationship("PostLike", backref="post", cascade="all, delete-orphan", passive_deletes=True)
+    comments = db.relationship("PostComment", backref="post", cascade="all, delete-orphan", passive_deletes=True)
 
     __table_args__ = (
         CheckConstraint("visibility_quality in ('Excellent','Good','Fair','Poor','Very Poor')", name="ck_post_visibility"),
@@ -121,6 +129,16 @@ class PostLike(db.Model):
         db.UniqueConstraint("user_id", "post_id", name="uq_like_user_post"),
     )
 
+class PostLikeArchive(db.Model):
+    """Old likes moved out of post_likes by `manage.py maintain`; still counted in likes_count."""
+    __tablename__ = "post_likes_archive"
+    post_id = db.Column(db.String(36), db.ForeignKey("dive_posts.id", ondelete="CASCADE"), primary_key=True)
+    user_id = db.Column(db.String(36), db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True, index=True)
+    created_at = db.Column(db.DateTime)
+
+    # no surrogate id or extra indexes: the (post_id, user_id) key is all lookups need
+    __table_args__ = {"sqlite_with_rowid": False}
+
 class PostComment(db.Model):
     __tablename__ = "post_comments"
     id = db.Column(db.String(36), primary_key=True, default=gen_uuid)
@@ -130,13 +148,239 @@ class PostComment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class LeaderboardEntry(db.Model):
+    """One diver's standing on one board, maintained on post writes (see leaderboards.py)."""
+    __tablename__ = "leaderboard_entries"
+    board = db.Column(db.String(15), primary_key=True)   # "deepest" | "dives"
+    scope = db.Column(db.String(36), primary_key=True)   # "global" or a dive spot id
+    period = db.Column(db.String(7), primary_key=True)   # "all" or "YYYY-MM" of dive_date
+    user_id = db.Column(db.String(36), db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True, index=True)
+    value = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        # top-N and rank lookups are range scans on this index
+        db.Index("ix_leaderboard_rank", "board", "scope", "period", "value"),
+    )
+
+class Job(db.Model):
+    """Background job row; see jobs.py. Finished jobs are deleted, failed ones end up "dead"."""
+    __tablename__ = "jobs"
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(JSON)
+    status = db.Column(db.String(10), nullable=False, default="queued")  # queued | running | dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(64))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index("ix_jobs_status_run_after", "status", "run_after"),
+    )
+
+class IdempotencyKey(db.Model):
+    """Stored outcome of a write request made with an Idempotency-Key header (see idempotency.py)."""
+    __tablename__ = "idempotency_keys"
+    scope = db.Column(db.String(36), primary_key=True)  # JWT identity, or "anon"
+    key = db.Column(db.String(255), primary_key=True)
+    fingerprint = db.Column(db.String(32), nullable=False)  # method + path + body digest
+    status_code = db.Column(db.Integer)  # NULL while the original request is in flight
+    response_body = db.Column(db.Text)
+    claimed_at = db.Column(db.DateTime)  # when the in-flight request took the key
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class SpotConditionsDay(db.Model):
+    """Per-spot, per-dive-date totals of reported conditions, maintained on post writes (see conditions.py)."""
+    __tablename__ = "spot_conditions_daily"
+    dive_spot_id = db.Column(db.String(36), db.ForeignKey("dive_spots.id", ondelete="CASCADE"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    dives = db.Column(db.Integer, nullable=False)
+    visibility_total = db.Column(db.Integer, nullable=False)  # sum of conditions.VISIBILITY_SCORES
+    current_total = db.Column(db.Integer, nullable=False)     # sum of conditions.CURRENT_SCORES
+    temp_dives = db.Column(db.Integer, nullable=False)        # dives that reported water_temp
+    temp_total = db.Column(db.Integer)
+    temp_min = db.Column(db.Integer)
+    temp_max = db.Column(db.Integer)
+
+# Hot ranking: log2 of engagement plus post age in half-lives. This is the log of
+# engagement * 2^(age / half-life), so every post decays at the same rate and the
+# relative order never changes as time passes — the score only has to be
+# rewritten when a post's own engagement changes, and the feed is an index scan.
+HOT_EPOCH = datetime(2025, 1, 1)
+HOT_HALF_LIFE_HOURS = 12
+HOT_COMMENT_WEIGHT = 2
+
+def hot_score(likes: int, comments: int, created_at: datetime) -> float:
+    engagement = 1 + (likes or 0) + HOT_COMMENT_WEIGHT * (comments or 0)
+    age = (created_at or datetime.utcnow()) - HOT_EPOCH
+    return math.log2(engagement) + age.total_seconds() / (HOT_HALF_LIFE_HOURS * 3600)
+
+class log2(FunctionElement):
+    """SQL log2(x); registered on SQLite connections in db.py, log(2, x) on Postgres."""
+    type = db.Float()
+    inherit_cache = True
+
+@compiles(log2)
+def _compile_log2(element, compiler, **kw):
+    return f"log2({compiler.process(element.clauses, **kw)})"
+
+@compiles(log2, "postgresql")
+def _compile_log2_postgresql(element, compiler, **kw):
+    return f"log(2.0, CAST({compiler.process(element.clauses, **kw)} AS NUMERIC))"
+
+def _engagement(likes, comments):
+    return 1 + likes + HOT_COMMENT_WEIGHT * comments
+
 # Helper queries for counts (aggregations if needed)
-def recalc_post_counts(post_id: str):
-    """Recalculate likes_count and comments_count for a post."""
-    like_count = db.session.query(db.func.count(PostLike.id)).filter_by(post_id=post_id).scalar()
+def recalc_post_counts(post_id: str, commit: bool = True):
+    """Recalculate likes_count, comments_count and hot_score for a post."""
+    like_count = (
+        db.session.query(db.func.count(PostLike.id)).filter_by(post_id=post_id).scalar()
+        + db.session.query(db.func.count()).select_from(PostLikeArchive).filter_by(post_id=post_id).scalar()
+    )
     comment_count = db.session.query(db.func.count(PostComment.id)).filter_by(post_id=post_id).scalar()
+    created_at = db.session.query(DivePost.created_at).filter_by(id=post_id).scalar()
     db.session.query(DivePost).filter_by(id=post_id).update({
         DivePost.likes_count: like_count,
-        DivePost.comments_count: comment_count
+        DivePost.comments_count: comment_count,
+        DivePost.hot_score: hot_score(like_count, comment_count, created_at),
     })
+    if commit:
+        db.session.commit()
+    return like_count, comment_count
+
+def refresh_hot_scores(batch_size: int = 1000):
+    """Recompute hot_score for every post in bulk (backfill or after tuning the weights)."""
+    posts = DivePost.__table__
+    rows = db.session.execute(
+        db.select(posts.c.id, posts.c.likes_count, posts.c.comments_count, posts.c.created_at)
+    ).all()
+    for i in range(0, len(rows), batch_size):
+        db.session.execute(
+            db.update(posts).where(posts.c.id == db.bindparam("b_id")).values(hot_score=db.bindparam("b_score")),
+            [{"b_id": r.id, "b_score": hot_score(r.likes_count, r.comments_count, r.created_at)}
+             for r in rows[i:i + batch_size]],
+        )
     db.session.commit()
+    return len(rows)
+
+# Set-based deletes: children go through ON DELETE CASCADE in the database and the
+# denormalized counters are adjusted with correlated UPDATEs, so nothing is loaded
+# into the session no matter how much a user or post has accumulated. The caller
+# commits, together with whatever else it derives from the deleted rows
+# (leaderboards, conditions rollups).
+
+def _not_below_zero(expr):
+    return db.case((expr < 0, 0), else_=expr)
+
+def recalc_user_stats(user_ids):
+    """Recompute dive stats for the given users from their remaining posts."""
+    posts = DivePost.__table__
+
+    def user_posts(col):
+        return db.select(col).where(posts.c.user_id == User.__table__.c.id).scalar_subquery()
+
+    db.session.execute(
+        db.update(User.__table__)
+        .where(User.__table__.c.id.in_(user_ids))
+        .values(
+            total_dives=user_posts(func.count(posts.c.id)),
+            total_bottom_time=user_posts(func.coalesce(func.sum(posts.c.dive_duration), 0)),
+            max_depth_achieved=user_posts(func.coalesce(func.max(posts.c.max_depth), 0)),
+        )
+    )
+
+def recalc_spot_totals(spot_ids):
+    """Recompute dive_spots.total_dives_logged for the given spots from their posts."""
+    posts = DivePost.__table__
+    spots = DiveSpot.__table__
+    db.session.execute(
+        db.update(spots)
+        .where(spots.c.id.in_(spot_ids))
+        .values(total_dives_logged=db.select(func.count(posts.c.id)).where(posts.c.dive_spot_id == spots.c.id).scalar_subquery())
+    )
+
+def _adjust_spot_totals(post_filter):
+    """Decrement dive_spots.total_dives_logged by the posts matching post_filter."""
+    posts = DivePost.__table__
+    spots = DiveSpot.__table__
+    removed = (
+        db.select(posts.c.dive_spot_id, func.count().label("n"))
+        .where(post_filter)
+        .group_by(posts.c.dive_spot_id)
+        .subquery()
+    )
+    db.session.execute(
+        db.update(spots)
+        .where(spots.c.id == removed.c.dive_spot_id)
+        .values(total_dives_logged=_not_below_zero(func.coalesce(spots.c.total_dives_logged, 0) - removed.c.n))
+    )
+
+def _adjust_post_counts(column, child, child_filter):
+    """Decrement a post counter by the child rows (likes/comments) matching child_filter, and its hot_score with it."""
+    posts = DivePost.__table__
+    # aggregate once and join (UPDATE ... FROM) instead of a correlated count per post
+    removed = (
+        db.select(child.c.post_id, func.count().label("n"))
+        .where(child_filter)
+        .group_by(child.c.post_id)
+        .subquery()
+    )
+    likes = func.coalesce(posts.c.likes_count, 0)
+    comments = func.coalesce(posts.c.comments_count, 0)
+    new_value = _not_below_zero(func.coalesce(posts.c[column], 0) - removed.c.n)
+    new_likes = new_value if column == "likes_count" else likes
+    new_comments = new_value if column == "comments_count" else comments
+    # hot_score is log2(engagement) + an age term, so shifting it by the change
+    # in log2(engagement) gives the new score without touching created_at
+    db.session.execute(
+        db.update(posts)
+        .where(posts.c.id == removed.c.post_id)
+        .values({
+            column: new_value,
+            "hot_score": posts.c.hot_score
+            + log2(_engagement(new_likes, new_comments))
+            - log2(_engagement(likes, comments)),
+        })
+    )
+
+def purge_post(post_id: str):
+    """Delete a post, its likes and comments, and fix up user and spot stats."""
+    posts = DivePost.__table__
+    user_id = db.session.execute(db.select(posts.c.user_id).where(posts.c.id == post_id)).scalar()
+    _adjust_spot_totals(posts.c.id == post_id)
+    db.session.execute(db.delete(posts).where(posts.c.id == post_id))
+    if user_id:
+        recalc_user_stats([user_id])
+
+def purge_user(user_id: str):
+    """Delete a user and everything they own, keeping other rows' counters correct."""
+    posts = DivePost.__table__
+    likes = PostLike.__table__
+    archived_likes = PostLikeArchive.__table__
+    comments = PostComment.__table__
+    # likes/comments left on other people's posts
+    _adjust_post_counts("likes_count", likes, likes.c.user_id == user_id)
+    _adjust_post_counts("likes_count", archived_likes, archived_likes.c.user_id == user_id)
+    _adjust_post_counts("comments_count", comments, comments.c.user_id == user_id)
+    _adjust_spot_totals(posts.c.user_id == user_id)
+    db.session.execute(db.delete(User.__table__).where(User.__table__.c.id == user_id))
+
+def purge_spot(spot_id: str):
+    """Delete a spot and its posts, fixing up the stats of every affected diver."""
+    posts = DivePost.__table__
+    users = User.__table__
+    author_ids = db.select(posts.c.user_id).where(posts.c.dive_spot_id == spot_id).distinct()
+    author_ids = [row[0] for row in db.session.execute(author_ids)]
+    db.session.execute(
+        db.update(users).where(users.c.favorite_spot_id == spot_id).values(favorite_spot_id=None)
+    )
+    # dive_posts.dive_spot_id has no ON DELETE CASCADE, so clear the posts first;
+    # their likes and comments still cascade in the database
+    db.session.execute(db.delete(posts).where(posts.c.dive_spot_id == spot_id))
+    db.session.execute(db.delete(DiveSpot.__table__).where(DiveSpot.__table__.c.id == spot_id))
+    if author_ids:
+        recalc_user_stats(author_ids)
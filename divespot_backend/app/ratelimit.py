@@ -0,0 +1,204 @@
+import math
+import threading
+import time
+from collections import Counter
+from flask import Flask, g, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+# (tokens per second, burst) for one caller on one endpoint
+DEFAULT_READ_LIMIT = (2.0, 60)     # 120/min sustained
+DEFAULT_WRITE_LIMIT = (0.5, 20)    # 30/min sustained
+ENDPOINT_LIMITS = {
+    "api.feed": (1.0, 30),
+    "api.like_post": (0.5, 10),
+    "api.unlike_post": (0.5, 10),
+    "api.create_comment": (0.2, 10),
+}
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+# POST but read-only; each of its GET sub-requests is charged to its own endpoint
+NOT_WRITES = {"api.batch"}
+# the image proxy is the busiest GET, needs no JWT (so is keyed by IP, shared
+# behind NAT) and never touches the database
+EXEMPT_ENDPOINTS = {"root", "static", "api.limiter_stats", "api.proxy_image"}
+
+
+class RateLimitStore:
+    """Token buckets held in this process.
+
+    Fine for a single worker; with several workers each one keeps its own
+    buckets, so use a shared store (e.g. Redis) to make the limits global.
+    """
+
+    max_keys = 50_000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def take(self, key: str, rate: float, burst: int, now: float):
+        """Spend one token; return (allowed, seconds until a token is available)."""
+        with self.lock:
+            tokens, last, _ = self.buckets.get(key, (burst, now, None))
+            tokens = min(burst, tokens + (now - last) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            # endpoints have different limits, so each bucket keeps its own refill time
+            self.buckets[key] = (tokens, now, burst / rate)
+            if len(self.buckets) > self.max_keys:
+                self._prune(now)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def _prune(self, now):
+        # a bucket idle long enough to have refilled is the same as no bucket
+        self.buckets = {k: v for k, v in self.buckets.items() if now - v[1] < v[2]}
+
+
+class RedisRateLimitStore(RateLimitStore):
+    """Token buckets in Redis, shared by every worker."""
+
+    # refill + take in one round trip, atomically
+    SCRIPT = """
+    local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or burst
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url: str, prefix: str = "divespot:ratelimit:"):
+        import redis  # optional dependency, only needed for multi-worker setups
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def take(self, key: str, rate: float, burst: int, now: float):
+        allowed, tokens = self.script(keys=[f"{self.prefix}{key}"], args=[rate, burst, now])
+        if allowed:
+            return True, 0.0
+        return False, (1 - float(tokens)) / rate
+
+
+class Limiter:
+    """Per-caller token buckets plus a cap on concurrent writes in this process.
+
+    Over the per-caller limit a request gets 429; when every write slot is
+    taken a write waits up to ``write_wait`` seconds and then gets 503. Both
+    carry Retry-After, so clients back off instead of piling up behind
+    SQLite's single writer as "database is locked" errors.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.store = None
+        self.limits = dict(ENDPOINT_LIMITS)
+        self.read_limit = DEFAULT_READ_LIMIT
+        self.write_limit = DEFAULT_WRITE_LIMIT
+        self.max_writes = 4
+        self.write_wait = 0.25
+        self.write_slots = threading.BoundedSemaphore(self.max_writes)
+        self.lock = threading.Lock()
+        self.counters = Counter()
+        self.limited_by_endpoint = Counter()
+        self.writes_in_flight = 0
+
+    def init_app(self, app: Flask, store: RateLimitStore = None):
+        self.enabled = app.config.get("RATELIMIT_ENABLED", True)
+        self.limits = dict(ENDPOINT_LIMITS, **app.config.get("RATELIMIT_ENDPOINTS", {}))
+        self.read_limit = app.config.get("RATELIMIT_READ", DEFAULT_READ_LIMIT)
+        self.write_limit = app.config.get("RATELIMIT_WRITE", DEFAULT_WRITE_LIMIT)
+        self.max_writes = app.config.get("MAX_CONCURRENT_WRITES", self.max_writes)
+        self.write_wait = app.config.get("WRITE_WAIT_SECONDS", self.write_wait)
+        self.write_slots = threading.BoundedSemaphore(self.max_writes)
+        redis_url = app.config.get("RATELIMIT_REDIS_URL")
+        self.store = store or (RedisRateLimitStore(redis_url) if redis_url else RateLimitStore())
+        app.extensions["limiter"] = self
+        app.before_request(self.before_request)
+        app.teardown_request(self.teardown_request)
+
+    def _caller(self):
+        try:
+            verify_jwt_in_request(optional=True)
+            identity = get_jwt_identity()
+        except Exception:
+            # bad/expired token: the route itself will reject it
+            identity = None
+        return f"user:{identity}" if identity else f"ip:{request.remote_addr}"
+
+    def _limit_for(self, endpoint, is_write):
+        return self.limits.get(endpoint) or (self.write_limit if is_write else self.read_limit)
+
+    def _reject(self, status, counter, endpoint, retry_after, message):
+        with self.lock:
+            self.counters[counter] += 1
+            self.limited_by_endpoint[endpoint] += 1
+        return {"error": message}, status, {"Retry-After": str(max(1, math.ceil(retry_after)))}
+
+    def check(self, endpoint, is_write=False):
+        """Spend one of the caller's tokens for endpoint; return a 429 response, or None if allowed.
+
+        Also used for batch sub-requests, which skip before_request: the
+        caller found for the batch (kept in g) pays for each item on the
+        item's own endpoint.
+        """
+        if not self.enabled or endpoint in EXEMPT_ENDPOINTS:
+            return None
+        if g.get("ratelimit_caller") is None:
+            g.ratelimit_caller = self._caller()
+        rate, burst = self._limit_for(endpoint, is_write)
+        allowed, retry_after = self.store.take(f"{g.ratelimit_caller}:{endpoint}", rate, burst, time.time())
+        if not allowed:
+            return self._reject(429, "limited", endpoint, retry_after, "rate limit exceeded, slow down")
+        return None
+
+    def before_request(self):
+        endpoint = request.endpoint
+        if not self.enabled or endpoint is None or endpoint in EXEMPT_ENDPOINTS or request.method == "OPTIONS":
+            return None
+        is_write = request.method not in READ_METHODS and endpoint not in NOT_WRITES
+
+        g.ratelimit_caller = self._caller()
+        rejected = self.check(endpoint, is_write)
+        if rejected is not None:
+            return rejected
+
+        if is_write:
+            if not self.write_slots.acquire(timeout=self.write_wait):
+                return self._reject(503, "shed", endpoint, 1, "server busy, retry shortly")
+            g.holds_write_slot = True
+            with self.lock:
+                self.writes_in_flight += 1
+        with self.lock:
+            self.counters["allowed"] += 1
+        return None
+
+    def teardown_request(self, exc=None):
+        if g.pop("holds_write_slot", False):
+            with self.lock:
+                self.writes_in_flight -= 1
+            self.write_slots.release()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "store": type(self.store).__name__,
+                "allowed": self.counters["allowed"],
+                "limited": self.counters["limited"],
+                "shed": self.counters["shed"],
+                "writes_in_flight": self.writes_in_flight,
+                "max_concurrent_writes": self.max_writes,
+                "rejected_by_endpoint": dict(self.limited_by_endpoint),
+            }
+
+
+limiter = Limiter()
@@ -1,12 +1,21 @@
-from flask import Blueprint, request, jsonify, abort
+from flask import Blueprint, Response, current_app, request, jsonify, abort
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
 from sqlalchemy.exc import IntegrityError
 from datetime import datetime, date
 from .db import db
-from .models import User, DiveSpot, DivePost, PostLike, PostComment, recalc_post_counts
+from .models import (
+    User, DiveSpot, DivePost, PostLike, PostLikeArchive, PostComment,
+    recalc_post_counts, purge_user, purge_post, purge_spot, hot_score,
+)
 from .utils import parse_date, parse_datetime, paginated_query
+from . import leaderboards, conditions
+from .jobs import enqueue
+from .idempotency import idempotent
+from .ratelimit import limiter
+from .events import broker, publish_post_event, post_channel, FEED_CHANNEL, TooManySubscribers
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 import re
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 
 api_bp = Blueprint("api", __name__)
 
@@ -28,6 +37,35 @@ def login():
 
 # ----------- helpers -----------
 
+def jobs_enabled():
+    """Whether post-write side effects go to the job queue instead of running inline."""
+    return current_app.config.get("JOBS_ENABLED", False)
+
+MAX_IDS_PER_REQUEST = 100
+
+def requested_ids():
+    """Unique ids from ?ids=a,b,c (or repeated ?ids=), in request order; ValueError carries the client message."""
+    ids = list(dict.fromkeys(
+        i.strip() for value in request.args.getlist("ids") for i in value.split(",") if i.strip()
+    ))
+    if not ids:
+        raise ValueError("ids must list at least one id (comma-separated)")
+    if len(ids) > MAX_IDS_PER_REQUEST:
+        raise ValueError(f"at most {MAX_IDS_PER_REQUEST} ids per request")
+    return ids
+
+def lookup_by_ids(model, to_dict):
+    """Resolve ?ids= with one IN query: found rows in request order plus the ids that don't exist."""
+    try:
+        ids = requested_ids()
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    found = {obj.id: obj for obj in model.query.filter(model.id.in_(ids))}
+    return {
+        "data": [to_dict(found[i]) for i in ids if i in found],
+        "missing": [i for i in ids if i not in found],
+    }
+
 def normalize_image_url(url):
     """
     Convert image URLs to use the proxy endpoint for cross-network compatibility.
@@ -113,6 +151,7 @@ def model_to_dict_post(p: DivePost):
         "notes": p.notes,
         "likes_count": p.likes_count,
         "comments_count": p.comments_count,
+        "hot_score": p.hot_score,
         "created_at": p.created_at.isoformat() if p.created_at else None,
         "dive_timestamp": p.dive_timestamp.isoformat() if p.dive_timestamp else None,
         "updated_at": p.updated_at.isoformat() if p.updated_at else None,
@@ -158,6 +197,7 @@ def login_user():
 # ----------- Users -----------
 
 @api_bp.route("/users", methods=["POST"])
+@idempotent
 def create_user():
     data = request.get_json(force=True)
     try:
@@ -183,6 +223,8 @@ def create_user():
 @api_bp.route("/users", methods=["GET"])
 @jwt_required()
 def list_users():
+    if "ids" in request.args:
+        return lookup_by_ids(User, model_to_dict_user)
     q = User.query.order_by(User.created_at.desc())
     items, meta = paginated_query(q)
     return {"data": [model_to_dict_user(u) for u in items], "meta": meta}
@@ -195,6 +237,7 @@ def get_user(user_id):
 
 @api_bp.route("/users/<user_id>", methods=["PUT", "PATCH"])
 @jwt_required()
+@idempotent
 def update_user(user_id):
     u = User.query.get(user_id)
     data = request.get_json(force=True)
@@ -238,9 +281,17 @@ def update_user(user_id):
 
 @api_bp.route("/users/<user_id>", methods=["DELETE"])
 @jwt_required()
+@idempotent
 def delete_user(user_id):
-    u = User.query.get_or_404(user_id)
-    db.session.delete(u)
+    if db.session.query(User.id).filter_by(id=user_id).first() is None:
+        abort(404)
+    days = conditions.user_days(user_id)
+    try:
+        purge_user(user_id)
+    except IntegrityError:
+        db.session.rollback()
+        return {"error": "user still owns dive spots"}, 409
+    conditions.refresh_days(days)
     db.session.commit()
     return {"deleted": True}
 
@@ -248,6 +299,7 @@ def delete_user(user_id):
 
 @api_bp.route("/spots", methods=["POST"])
 @jwt_required()
+@idempotent
 def create_spot():
     data = request.get_json(force=True)
     
@@ -307,6 +359,8 @@ def create_spot():
 @api_bp.route("/spots", methods=["GET"])
 @jwt_required()
 def list_spots():
+    if "ids" in request.args:
+        return lookup_by_ids(DiveSpot, model_to_dict_spot)
     q = DiveSpot.query
     # optional filters
     name = request.args.get("name")
@@ -337,6 +391,7 @@ def get_spot(spot_id):
 
 @api_bp.route("/spots/<spot_id>", methods=["PUT", "PATCH"])
 @jwt_required()
+@idempotent
 def update_spot(spot_id):
     s = DiveSpot.query.get_or_404(spot_id)
     data = request.get_json(force=True)
@@ -355,16 +410,64 @@ def update_spot(spot_id):
 
 @api_bp.route("/spots/<spot_id>", methods=["DELETE"])
 @jwt_required()
+@idempotent
 def delete_spot(spot_id):
-    s = DiveSpot.query.get_or_404(spot_id)
-    db.session.delete(s)
+    if db.session.query(DiveSpot.id).filter_by(id=spot_id).first() is None:
+        abort(404)
+    author_ids = [row[0] for row in db.session.query(DivePost.user_id).filter_by(dive_spot_id=spot_id).distinct()]
+    purge_spot(spot_id)
+    leaderboards.drop_spot(spot_id, author_ids)
     db.session.commit()
     return {"deleted": True}
 
+# ----------- Spot conditions -----------
+
+def conditions_window():
+    """(window, first day) from ?window= and ?bucket=; ValueError carries the client message."""
+    window = request.args.get("window", "7d")
+    if window not in conditions.WINDOWS:
+        raise ValueError(f"window must be one of {', '.join(conditions.WINDOWS)}")
+    if request.args.get("bucket", "day") not in conditions.BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(conditions.BUCKETS)}")
+    return window, conditions.window_start(window)
+
+@api_bp.route("/spots/<spot_id>/conditions", methods=["GET"])
+@jwt_required()
+def spot_conditions(spot_id):
+    if db.session.query(DiveSpot.id).filter_by(id=spot_id).first() is None:
+        abort(404)
+    try:
+        window, start = conditions_window()
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    summary = conditions.summaries([spot_id], start).get(spot_id)
+    return {
+        "spot_id": spot_id,
+        "summary": summary,
+        "data": conditions.daily(spot_id, start),
+        "meta": {"window": window, "bucket": "day", "from": start.isoformat(), "to": date.today().isoformat()},
+    }
+
+# Planning screen: summaries for many spots from the rollups in one grouped query
+@api_bp.route("/spots/conditions", methods=["GET"])
+@jwt_required()
+def spots_conditions():
+    try:
+        ids = requested_ids()
+        window, start = conditions_window()
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    found = conditions.summaries(ids, start)
+    return {
+        "data": [{"spot_id": i, "summary": found.get(i)} for i in ids],
+        "meta": {"window": window, "from": start.isoformat(), "to": date.today().isoformat()},
+    }
+
 # ----------- Posts -----------
 
 @api_bp.route("/posts", methods=["POST"])
 @jwt_required()
+@idempotent
 def create_post():
     data = request.get_json(force=True)
     post = DivePost(
@@ -385,8 +488,17 @@ def create_post():
         notes=data.get("notes"),
         dive_timestamp=parse_datetime(data.get("dive_timestamp") or datetime.utcnow().isoformat())
     )
+    post.created_at = datetime.utcnow()
+    post.hot_score = hot_score(0, 0, post.created_at)
     db.session.add(post)
 
+    if jobs_enabled():
+        # stats and leaderboards are applied by the worker, committed with the post
+        db.session.flush()
+        enqueue("post_created", {"post_id": post.id})
+        db.session.commit()
+        return model_to_dict_post(post), 201
+
     # Update user stats and spot total_dives_logged
     user = User.query.get(post.user_id)
     if user:
@@ -400,12 +512,16 @@ def create_post():
         spot.total_dives_logged = (spot.total_dives_logged or 0) + 1
         spot.updated_at = datetime.utcnow()
 
+    leaderboards.refresh_entries(post.user_id, post.dive_spot_id, post.dive_date)
+    conditions.refresh_days([(post.dive_spot_id, post.dive_date)])
     db.session.commit()
     return model_to_dict_post(post), 201
 
 @api_bp.route("/posts", methods=["GET"])
 @jwt_required()
 def list_posts():
+    if "ids" in request.args:
+        return lookup_by_ids(DivePost, model_to_dict_post)
     q = DivePost.query
     # filters
     user_id = request.args.get("user_id")
@@ -426,9 +542,11 @@ def get_post(post_id):
 
 @api_bp.route("/posts/<post_id>", methods=["PUT", "PATCH"])
 @jwt_required()
+@idempotent
 def update_post(post_id):
     p = DivePost.query.get_or_404(post_id)
     data = request.get_json(force=True)
+    old_dive_date = p.dive_date
     for field in ["caption","visibility_quality","water_temp","wind_conditions","current_conditions","sea_life","buddy_names","equipment","notes","image_urls","dive_duration","max_depth"]:
         if field in data:
             setattr(p, field, data[field])
@@ -437,22 +555,37 @@ def update_post(post_id):
     if "dive_timestamp" in data and data["dive_timestamp"]:
         p.dive_timestamp = parse_datetime(data["dive_timestamp"])
     p.updated_at = datetime.utcnow()
+    leaderboards.refresh_entries(p.user_id, p.dive_spot_id, p.dive_date)
+    if leaderboards.month_key(old_dive_date) != leaderboards.month_key(p.dive_date):
+        leaderboards.refresh_entries(p.user_id, p.dive_spot_id, old_dive_date)
+    conditions.refresh_days([(p.dive_spot_id, p.dive_date), (p.dive_spot_id, old_dive_date)])
     db.session.commit()
     return model_to_dict_post(p)
 
 @api_bp.route("/posts/<post_id>", methods=["DELETE"])
 @jwt_required()
+@idempotent
 def delete_post(post_id):
-    p = DivePost.query.get_or_404(post_id)
-    db.session.delete(p)
+    key = db.session.query(DivePost.user_id, DivePost.dive_spot_id, DivePost.dive_date).filter_by(id=post_id).first()
+    if key is None:
+        abort(404)
+    purge_post(post_id)
+    leaderboards.refresh_entries(*key)
+    conditions.refresh_days([(key.dive_spot_id, key.dive_date)])
     db.session.commit()
     return {"deleted": True}
 
-# Feed (recent 30 days default order by created_at desc)
+# Feed (recent 30 days default order by created_at desc, ?sort=hot for trending)
 @api_bp.route("/feed", methods=["GET"])
 @jwt_required()
 def feed():
-    q = DivePost.query.order_by(DivePost.created_at.desc())
+    sort = request.args.get("sort", "recent")
+    if sort == "hot":
+        q = DivePost.query.order_by(DivePost.hot_score.desc())
+    elif sort == "recent":
+        q = DivePost.query.order_by(DivePost.created_at.desc())
+    else:
+        return {"error": "sort must be 'recent' or 'hot'"}, 400
     items, meta = paginated_query(q, default_limit=20)
     
     # Enrich posts with user and dive spot information
@@ -474,46 +607,117 @@ def feed():
     
     return {"data": enriched_posts, "meta": meta}
 
+# ----------- Leaderboards -----------
+
+@api_bp.route("/leaderboards", methods=["GET"])
+@jwt_required()
+def get_leaderboard():
+    board = request.args.get("board", "deepest")
+    if board not in leaderboards.BOARDS:
+        return {"error": f"board must be one of {', '.join(leaderboards.BOARDS)}"}, 400
+    scope = request.args.get("spot_id") or leaderboards.GLOBAL
+    period = request.args.get("period", leaderboards.ALL_TIME)
+    if period == "month":
+        period = leaderboards.month_key(date.today())
+    elif period != leaderboards.ALL_TIME:
+        try:
+            period = leaderboards.month_key(datetime.strptime(period, "%Y-%m"))
+        except ValueError:
+            return {"error": "period must be 'all', 'month' or YYYY-MM"}, 400
+
+    try:
+        limit = max(1, min(int(request.args.get("limit", 10)), 100))
+        offset = max(0, int(request.args.get("offset", 0)))
+    except ValueError:
+        return {"error": "limit and offset must be integers"}, 400
+    rows = leaderboards.top(board, scope, period, limit, offset)
+    # ties share a rank, matching rank_of()
+    data = []
+    for i, r in enumerate(rows):
+        if data and data[-1]["value"] == r.value:
+            rank = data[-1]["rank"]
+        elif i == 0 and offset:
+            rank = leaderboards.rank_of(board, scope, period, r.user_id)[0]
+        else:
+            rank = offset + i + 1
+        data.append({
+            "rank": rank, "value": r.value, "user_id": r.user_id, "username": r.username,
+            "display_name": r.display_name, "profile_image_url": r.profile_image_url,
+        })
+
+    me = None
+    user_id = request.args.get("user_id") or get_jwt_identity()
+    standing = leaderboards.rank_of(board, scope, period, user_id) if user_id else None
+    if standing:
+        me = {"user_id": user_id, "rank": standing[0], "value": standing[1]}
+    return {"data": data, "me": me, "meta": {"board": board, "scope": scope, "period": period, "limit": limit, "offset": offset}}
+
 # ----------- Likes -----------
 
 @api_bp.route("/posts/<post_id>/like", methods=["POST"])
 @jwt_required()
+@idempotent
 def like_post(post_id):
     data = request.get_json(silent=True) or {}
     user_id = data.get("user_id")
     if not user_id:
         return {"error": "user_id required"}, 400
+    if db.session.get(PostLikeArchive, (post_id, user_id)) is not None:
+        # liked long ago and archived; the like still counts
+        return {"liked": True, "post_id": post_id}
     # idempotent-ish: catch duplicate unique constraint
     like = PostLike(user_id=user_id, post_id=post_id)
     db.session.add(like)
+    if jobs_enabled():
+        enqueue("post_counts", {"post_id": post_id, "event": "like", "user_id": user_id})
     try:
         db.session.commit()
     except IntegrityError:
         db.session.rollback()
         # already liked — treat as success
+    if jobs_enabled():
+        return {"liked": True, "post_id": post_id}
     # update counts
-    recalc_post_counts(post_id)
+    likes_count, _ = recalc_post_counts(post_id)
+    publish_post_event(post_id, "like", {"user_id": user_id, "likes_count": likes_count})
     return {"liked": True, "post_id": post_id}
 
 @api_bp.route("/posts/<post_id>/unlike", methods=["POST"])
 @jwt_required()
+@idempotent
 def unlike_post(post_id):
     data = request.get_json(silent=True) or {}
     user_id = data.get("user_id")
     if not user_id:
         return {"error": "user_id required"}, 400
     PostLike.query.filter_by(user_id=user_id, post_id=post_id).delete()
+    PostLikeArchive.query.filter_by(user_id=user_id, post_id=post_id).delete()
+    if jobs_enabled():
+        enqueue("post_counts", {"post_id": post_id, "event": "unlike", "user_id": user_id})
+        db.session.commit()
+        return {"unliked": True, "post_id": post_id}
     db.session.commit()
-    recalc_post_counts(post_id)
+    likes_count, _ = recalc_post_counts(post_id)
+    publish_post_event(post_id, "unlike", {"user_id": user_id, "likes_count": likes_count})
     return {"unliked": True, "post_id": post_id}
 
 @api_bp.route("/posts/<post_id>/likes", methods=["GET"])
 @jwt_required()
 def list_likes(post_id):
-    q = PostLike.query.filter_by(post_id=post_id).order_by(PostLike.created_at.desc())
+    # archived likes still count in likes_count, so list them too; they have no id
+    live = db.select(PostLike.id, PostLike.user_id, PostLike.post_id, PostLike.created_at).where(PostLike.post_id == post_id)
+    archived = db.select(
+        db.cast(db.null(), PostLike.id.type).label("id"),
+        PostLikeArchive.user_id, PostLikeArchive.post_id, PostLikeArchive.created_at,
+    ).where(PostLikeArchive.post_id == post_id)
+    likes = db.union_all(live, archived).subquery()
+    q = db.session.query(likes).order_by(likes.c.created_at.desc())
     items, meta = paginated_query(q)
     return {
-        "data": [{"id": l.id, "user_id": l.user_id, "post_id": l.post_id, "created_at": l.created_at.isoformat()} for l in items],
+        "data": [
+            {"id": l.id, "user_id": l.user_id, "post_id": l.post_id, "created_at": l.created_at.isoformat() if l.created_at else None}
+            for l in items
+        ],
         "meta": meta
     }
 
@@ -521,14 +725,21 @@ def list_likes(post_id):
 
 @api_bp.route("/posts/<post_id>/comments", methods=["POST"])
 @jwt_required()
+@idempotent
 def create_comment(post_id):
     data = request.get_json(force=True)
     if not data.get("user_id") or not data.get("content"):
         return {"error": "user_id and content are required"}, 400
     c = PostComment(user_id=data["user_id"], post_id=post_id, content=data["content"])
     db.session.add(c)
+    if jobs_enabled():
+        db.session.flush()
+        enqueue("post_counts", {"post_id": post_id, "event": "comment", "comment": model_to_dict_comment(c)})
+        db.session.commit()
+        return model_to_dict_comment(c), 201
     db.session.commit()
-    recalc_post_counts(post_id)
+    _, comments_count = recalc_post_counts(post_id)
+    publish_post_event(post_id, "comment", {"comment": model_to_dict_comment(c), "comments_count": comments_count})
     return model_to_dict_comment(c), 201
 
 @api_bp.route("/posts/<post_id>/comments", methods=["GET"])
@@ -540,6 +751,7 @@ def list_comments(post_id):
 
 @api_bp.route("/comments/<comment_id>", methods=["PUT", "PATCH"])
 @jwt_required()
+@idempotent
 def update_comment(comment_id):
     c = PostComment.query.get_or_404(comment_id)
     data = request.get_json(force=True)
@@ -551,6 +763,7 @@ def update_comment(comment_id):
 
 @api_bp.route("/comments/<comment_id>", methods=["DELETE"])
 @jwt_required()
+@idempotent
 def delete_comment(comment_id):
     c = PostComment.query.get_or_404(comment_id)
     post_id = c.post_id
@@ -559,6 +772,89 @@ def delete_comment(comment_id):
     recalc_post_counts(post_id)
     return {"deleted": True}
 
+# ----------- Live events (SSE) -----------
+
+def event_stream(channels):
+    last_event_id = request.headers.get("Last-Event-ID")
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    try:
+        sub = broker.subscribe(channels, last_event_id=last_event_id)
+    except TooManySubscribers:
+        return {"error": "too many live connections, retry later"}, 503, {"Retry-After": "10"}
+    return Response(
+        broker.stream(sub),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@api_bp.route("/posts/<post_id>/events", methods=["GET"])
+@jwt_required()
+def post_events(post_id):
+    if db.session.query(DivePost.id).filter_by(id=post_id).first() is None:
+        abort(404)
+    # release the connection before the long-lived stream starts
+    db.session.remove()
+    return event_stream([post_channel(post_id)])
+
+@api_bp.route("/feed/events", methods=["GET"])
+@jwt_required()
+def feed_events():
+    return event_stream([FEED_CHANNEL])
+
+# ----------- Batch -----------
+
+BATCH_MAX_REQUESTS = 20
+# streaming / proxying endpoints can't be folded into a JSON envelope
+BATCH_EXCLUDED_ENDPOINTS = {"api.batch", "api.post_events", "api.feed_events", "api.proxy_image"}
+
+def dispatch_batch_item(path):
+    """Run one GET sub-request in-process and return (status, body)."""
+    environ = EnvironBuilder(path=f"{request.script_root}/api{path}", method="GET").get_environ()
+    # the app context (and so the db session and the verified JWT in g) is shared
+    with current_app.request_context(environ) as ctx:
+        try:
+            endpoint, view_args = ctx.url_adapter.match(method="GET")
+        except HTTPException as e:
+            return e.code, {"error": e.description}
+        if not endpoint.startswith("api.") or endpoint in BATCH_EXCLUDED_ENDPOINTS:
+            return 400, {"error": "endpoint not allowed in batch"}
+        # sub-requests skip before_request, so charge each one to its own endpoint here
+        rejected = limiter.check(endpoint)
+        if rejected is not None:
+            body, status, headers = rejected
+            return status, dict(body, retry_after=int(headers["Retry-After"]))
+        view = current_app.view_functions[endpoint]
+        # the batch request already passed jwt_required; skip re-verifying per item
+        view = getattr(view, "__wrapped__", view)
+        try:
+            resp = current_app.make_response(view(**view_args))
+        except HTTPException as e:
+            return e.code, {"error": e.description}
+        return resp.status_code, resp.get_json(silent=True)
+
+@api_bp.route("/batch", methods=["POST"])
+@jwt_required()
+def batch():
+    data = request.get_json(force=True)
+    items = data.get("requests") if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return {"error": "requests must be a non-empty list"}, 400
+    if len(items) > BATCH_MAX_REQUESTS:
+        return {"error": f"at most {BATCH_MAX_REQUESTS} requests per batch"}, 400
+
+    responses = []
+    for i, item in enumerate(items):
+        path = item.get("path") if isinstance(item, dict) else None
+        if not isinstance(path, str) or not path.startswith("/"):
+            status, body = 400, {"error": "path must start with /"}
+        else:
+            status, body = dispatch_batch_item(path)
+        responses.append({"id": item.get("id", i) if isinstance(item, dict) else i, "status": status, "body": body})
+    return {"responses": responses}
+
 # ----------- Image Proxy -----------
 
 @api_bp.route("/images/<path:image_path>", methods=["GET"])
@@ -567,9 +863,8 @@ def proxy_image(image_path):
     Proxy images from the image service to handle cross-network access.
     This allows iOS simulator to access images uploaded from different networks.
     """
-    import requests
-    from flask import Response
-    
+    import requests  # only the proxy needs it; keep it off the boot path
+
     # Try different possible image service URLs
     possible_urls = [
         f"http://localhost:5010/files/{image_path}",
@@ -595,3 +890,11 @@ def proxy_image(image_path):
     
     # If no URL worked, return 404
     abort(404, description="Image not found")
+
+# ----------- Monitoring -----------
+
+@api_bp.route("/limits", methods=["GET"])
+@jwt_required()
+def limiter_stats():
+    """Rate limiter / load shedding counters for this worker process."""
+    return limiter.stats()
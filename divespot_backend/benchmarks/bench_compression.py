@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Compression ratio and CPU cost on real /api/feed, /api/spots and /api/posts pages.
+
+    python benchmarks/bench_compression.py [--posts 200] [--repeat 50]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+from app import create_app, compression
+from app.db import db
+from app.models import User, DiveSpot, DivePost
+
+
+def seed(n_posts):
+    now = datetime.utcnow()
+    db.session.execute(db.insert(User.__table__), [
+        {"id": f"u{i}", "username": f"diver{i}", "email": f"diver{i}@example.com", "display_name": f"Diver {i}",
+         "bio": "Cold water, kelp forests and sevengill sharks.", "location": "Cape Town"}
+        for i in range(20)
+    ])
+    db.session.execute(db.insert(DiveSpot.__table__), [
+        {"id": f"s{i}", "name": f"Spot {i}", "description": "Dramatic underwater topography with caves and swim-throughs",
+         "latitude": -34.3 + i / 100, "longitude": 18.4, "difficulty": "Intermediate", "created_by": "u0"}
+        for i in range(10)
+    ])
+    db.session.execute(db.insert(DivePost.__table__), [
+        {"id": f"p{i}", "user_id": f"u{i % 20}", "dive_spot_id": f"s{i % 10}", "caption": f"Great viz today #{i}",
+         "image_urls": [f"http://localhost:5010/files/{i:032x}.jpg"], "dive_date": date.today(), "max_depth": 18,
+         "dive_duration": 42, "visibility_quality": "Good", "wind_conditions": "Light", "current_conditions": "None",
+         "sea_life": ["pyjama shark", "seal"], "buddy_names": ["Alex", "Sam"], "equipment": ["5mm wetsuit"],
+         "dive_timestamp": now, "created_at": now}
+        for i in range(n_posts)
+    ])
+    db.session.commit()
+
+
+def measure(body, encoding, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        out = compression.compress(body, encoding)
+    cpu_ms = (time.process_time() - start) * 1000 / repeat
+    return len(out), cpu_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    encodings = ["gzip"] + (["br"] if compression.brotli is not None else [])
+    if compression.brotli is None:
+        print("(Brotli not installed; gzip only)")
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp}/bench.db", "COMPRESS_ENABLED": False, "RATELIMIT_ENABLED": False})
+        with app.app_context():
+            seed(args.posts)
+            token = create_access_token(identity="u0")
+        client = app.test_client()
+        headers = {"Authorization": f"Bearer {token}"}
+        for path in ("/api/feed?limit=20", "/api/feed?limit=100", "/api/spots?limit=100", "/api/posts?limit=100"):
+            body = client.get(path, headers=headers).get_data()
+            print(f"{path:<24} {len(body):>8} B")
+            for encoding in encodings:
+                size, cpu_ms = measure(body, encoding, args.repeat)
+                print(f"  {encoding:>4}: {size:>8} B  ratio {len(body) / size:5.1f}x  {cpu_ms:6.2f} ms CPU")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Delete a diver with 10k likes: ORM cascade vs. set-based purge_user.
+
+    python benchmarks/bench_delete_user.py [--likes 10000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.db import db
+from app.models import User, DiveSpot, DivePost, PostLike, PostComment, purge_user
+
+# the ORM path trips "expected to delete N rows" once the DB cascade has beaten it to them
+warnings.filterwarnings("ignore", message="DELETE statement on table")
+
+
+def seed(n_likes):
+    now = datetime.utcnow()
+    db.session.execute(db.insert(User.__table__), [
+        {"id": "author", "username": "author", "email": "author@x", "display_name": "Author"},
+        {"id": "diver", "username": "diver", "email": "diver@x", "display_name": "Diver"},
+    ])
+    db.session.execute(db.insert(DiveSpot.__table__), [{
+        "id": "spot", "name": "Castle Rock", "latitude": -34.35, "longitude": 18.46,
+        "difficulty": "Advanced", "created_by": "author", "total_dives_logged": n_likes + 10,
+    }])
+    post = {
+        "dive_spot_id": "spot", "dive_date": date.today(), "max_depth": 18, "dive_duration": 40,
+        "visibility_quality": "Good", "wind_conditions": "Calm", "current_conditions": "None",
+        "dive_timestamp": now, "created_at": now, "likes_count": 1, "comments_count": 1,
+    }
+    db.session.execute(db.insert(DivePost.__table__), [
+        dict(post, id=f"p{i}", user_id="author") for i in range(n_likes)
+    ] + [
+        dict(post, id=f"d{i}", user_id="diver", likes_count=0, comments_count=0) for i in range(10)
+    ])
+    db.session.execute(db.insert(PostLike.__table__), [
+        {"id": f"l{i}", "user_id": "diver", "post_id": f"p{i}", "created_at": now} for i in range(n_likes)
+    ])
+    db.session.execute(db.insert(PostComment.__table__), [
+        {"id": f"c{i}", "user_id": "diver", "post_id": f"p{i}", "content": "nice", "created_at": now}
+        for i in range(n_likes)
+    ])
+    db.session.commit()
+
+
+def orm_delete(user_id):
+    # what the non-passive "all, delete-orphan" cascade did: load and delete every child
+    u = db.session.get(User, user_id)
+    for child in list(u.likes) + list(u.comments):
+        db.session.delete(child)
+    for post in u.posts:
+        for child in list(post.likes) + list(post.comments):
+            db.session.delete(child)
+        db.session.delete(post)
+    db.session.delete(u)
+    db.session.commit()
+
+
+def purge_delete(user_id):
+    purge_user(user_id)
+    db.session.commit()
+
+
+def run(label, fn, n_likes):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp}/bench.db"})
+        with app.app_context():
+            seed(n_likes)
+            db.session.expunge_all()
+            tracemalloc.start()
+            start = time.perf_counter()
+            fn("diver")
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            likes = db.session.execute(db.select(db.func.sum(DivePost.likes_count))).scalar()
+            spot_total = db.session.get(DiveSpot, "spot").total_dives_logged
+            print(f"{label:>10}: {elapsed * 1000:8.1f} ms  peak {peak / 1024 / 1024:6.1f} MiB  "
+                  f"sum(likes_count)={likes} spot.total_dives_logged={spot_total}")
+            db.session.remove()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--likes", type=int, default=10000)
+    args = parser.parse_args()
+    run("orm", orm_delete, args.likes)
+    run("purge", purge_delete, args.likes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Job queue throughput, and recovery after a worker is killed mid-job.
+
+    python benchmarks/bench_jobs.py [--jobs 2000] [--threads 1 2 4]
+    python benchmarks/bench_jobs.py --crash
+
+--crash starts a worker process, SIGKILLs it while it holds jobs, then lets a
+fresh worker reclaim the orphaned leases and checks every job's effect was
+committed exactly once.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.db import db
+from app.models import Job
+from app import jobs
+
+
+@jobs.job("bench_noop")
+def bench_noop(payload):
+    pass
+
+
+@jobs.job("bench_mark")
+def bench_mark(payload):
+    time.sleep(payload.get("sleep", 0))
+    # side effect in the same transaction as the job's removal
+    db.session.execute(db.text("INSERT INTO bench_marks (n) VALUES (:n)"), {"n": payload["n"]})
+
+
+def make_app(db_path):
+    return create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_path}"})
+
+
+def pending():
+    return db.session.query(Job).filter(Job.status != "dead").count()
+
+
+def drain(app, threads, lease=jobs.LEASE_SECONDS):
+    stop = threading.Event()
+    pool = [threading.Thread(target=jobs.work, args=(app, f"bench:{i}", stop, lease, 0.05)) for i in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    with app.app_context():
+        while pending():
+            db.session.rollback()
+            time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for t in pool:
+        t.join()
+    return elapsed
+
+
+def throughput(n_jobs, thread_counts):
+    for threads in thread_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            app = make_app(os.path.join(tmp, "bench.db"))
+            with app.app_context():
+                t0 = time.perf_counter()
+                for i in range(n_jobs):
+                    jobs.enqueue("bench_noop", {"i": i})
+                db.session.commit()
+                enqueue_s = time.perf_counter() - t0
+            elapsed = drain(app, threads)
+            print(f"threads={threads}: enqueue {n_jobs / enqueue_s:8.0f} jobs/s  "
+                  f"process {n_jobs / elapsed:8.0f} jobs/s")
+
+
+def crash(n_jobs=20):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        app = make_app(db_path)
+        with app.app_context():
+            db.session.execute(db.text("CREATE TABLE bench_marks (n INTEGER)"))
+            for i in range(n_jobs):
+                jobs.enqueue("bench_mark", {"n": i, "sleep": 0.2})
+            db.session.commit()
+
+        proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker", db_path])
+        with app.app_context():
+            deadline = time.monotonic() + 30
+            while db.session.query(Job).filter(Job.status == "running").count() < 2:
+                db.session.rollback()
+                if time.monotonic() > deadline:
+                    proc.kill()
+                    raise SystemExit("worker never picked up jobs")
+                time.sleep(0.02)
+            proc.send_signal(signal.SIGKILL)
+            proc.wait()
+            db.session.rollback()
+            orphaned = db.session.query(Job).filter(Job.status == "running").count()
+            left = pending()
+            print(f"killed worker: {n_jobs - left} done, {orphaned} orphaned mid-job, {left} left")
+
+        drain(app, threads=2, lease=1)
+        with app.app_context():
+            marks = [r[0] for r in db.session.execute(db.text("SELECT n FROM bench_marks"))]
+            dead = db.session.query(Job).filter(Job.status == "dead").count()
+        ok = sorted(marks) == list(range(n_jobs)) and dead == 0
+        print(f"after recovery: {len(marks)} effects for {n_jobs} jobs, {dead} dead -> {'OK' if ok else 'FAILED'}")
+        return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--crash", action="store_true")
+    parser.add_argument("--worker", metavar="DB_PATH", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        jobs.run_workers(make_app(args.worker), threads=2, poll_interval=0.05)
+    elif args.crash:
+        sys.exit(0 if crash() else 1)
+    else:
+        throughput(args.jobs, args.threads)
+
+
+if __name__ == "__main__":
+    main()
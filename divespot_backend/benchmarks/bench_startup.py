@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Worker cold-start cost: import time (python -X importtime) and create_app().
+
+    python benchmarks/bench_startup.py [--top 15] [--runs 5]
+
+Each run is a fresh interpreter against a throwaway SQLite database, once with
+DB_STARTUP_MODE=create_all and once with DB_STARTUP_MODE=migrations.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+BOOT = """
+import time
+t0 = time.perf_counter()
+from app import create_app
+t1 = time.perf_counter()
+create_app()
+t2 = time.perf_counter()
+print(f"{(t1 - t0) * 1000:.1f} {(t2 - t1) * 1000:.1f}")
+"""
+
+
+def prepare_db(path):
+    # the real `manage.py migrate`, pointed at the same DATABASE_URL the boots use
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{path}")
+    subprocess.run([sys.executable, "manage.py", "migrate"], cwd=BACKEND_DIR, env=env, capture_output=True, check=True)
+
+
+def boot(db_path, mode, importtime=False):
+    env = dict(os.environ, DB_STARTUP_MODE=mode, DATABASE_URL=f"sqlite:///{db_path}")
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", BOOT]
+    proc = subprocess.run(cmd, cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+    import_ms, create_ms = (float(x) for x in proc.stdout.split()[-2:])
+    return import_ms, create_ms, proc.stderr
+
+
+def top_imports(stderr, n):
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return sorted(rows, reverse=True)[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        prepare_db(db_path)
+        for mode in ("create_all", "migrations"):
+            runs = [boot(db_path, mode) for _ in range(args.runs)]
+            print(f"{mode:>10}: import {statistics.median(r[0] for r in runs):7.1f} ms  "
+                  f"create_app {statistics.median(r[1] for r in runs):7.1f} ms  (median of {args.runs})")
+
+        _, _, stderr = boot(db_path, "migrations", importtime=True)
+        print("\nslowest imports (cumulative, us):")
+        for cumulative, self_us, name in top_imports(stderr, args.top):
+            print(f"{cumulative:>10} {self_us:>10}  {name}")
+
+
+if __name__ == "__main__":
+    main()
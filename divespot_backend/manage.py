@@ -1,14 +1,19 @@
 #!/usr/bin/env python3
 import os
+import re
 import sqlite3
 from pathlib import Path
 from flask import Flask
 from app import create_app
-from app.db import db
-from app.models import User
+from sqlalchemy import create_engine, text
+from app.db import db, MIGRATIONS, POSTGRES_MIGRATIONS_DIR, database_url, sqlite_path
+from app import leaderboards, conditions, jobs, maintenance
+from app.models import User, refresh_hot_scores
 
-MIGRATIONS = ["migrations/001_initial.sql", "migrations/002_seed_spots.sql"]
-DB_PATH = "dive_spot.db"
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATABASE_URL = database_url(os.getenv("DATABASE_URL"))
+# same file the API opens (relative SQLite paths resolve to instance/)
+DB_PATH = sqlite_path(DATABASE_URL) if DATABASE_URL.startswith("sqlite") else None
 
 def apply_sql(sql_path: str):
     print(f"> Applying {sql_path}")
@@ -18,7 +23,24 @@ def apply_sql(sql_path: str):
             conn.executescript(f.read())
         conn.commit()
 
+ADD_COLUMN_RE = re.compile(r"ALTER\s+TABLE\s+(\w+)\s+ADD\s+COLUMN\s+(\w+)[^;]*;", re.IGNORECASE)
+
+def skip_existing_columns(conn, script: str) -> str:
+    """Drop ADD COLUMN statements whose column is already there.
+
+    Databases first built by create_all() already have every model column,
+    and SQLite has no ADD COLUMN IF NOT EXISTS.
+    """
+    def keep(match):
+        table, column = match.group(1), match.group(2)
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        return "" if column in existing else match.group(0)
+    return ADD_COLUMN_RE.sub(keep, script)
+
 def migrate():
+    if not DATABASE_URL.startswith("sqlite"):
+        migrate_postgres()
+        return
     # simple file-based migration tracker
     mig_table_sql = """
     CREATE TABLE IF NOT EXISTS _migrations (
@@ -27,6 +49,7 @@ def migrate():
         applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
     );
     """
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
     with sqlite3.connect(DB_PATH) as conn:
         conn.execute("PRAGMA foreign_keys = ON;")
         conn.execute(mig_table_sql)
@@ -36,14 +59,41 @@ def migrate():
             cur = conn.execute("SELECT 1 FROM _migrations WHERE filename = ?", (m,))
             if cur.fetchone() is None:
                 print(f"Running migration {m}")
-                with open(m, "r", encoding="utf-8") as f:
-                    conn.executescript(f.read())
+                with open(os.path.join(BASE_DIR, m), "r", encoding="utf-8") as f:
+                    conn.executescript(skip_existing_columns(conn, f.read()))
                 conn.execute("INSERT INTO _migrations (filename) VALUES (?)", (m,))
                 conn.commit()
             else:
                 print(f"Already applied: {m}")
 
+def migrate_postgres():
+    # same tracker and file names as SQLite, so check_schema_version works unchanged
+    engine = create_engine(DATABASE_URL)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS _migrations (
+            id SERIAL PRIMARY KEY,
+            filename TEXT NOT NULL UNIQUE,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """)
+    for m in MIGRATIONS:
+        # DDL is transactional in Postgres: a failing file leaves nothing half-applied
+        with engine.begin() as conn:
+            if conn.execute(text("SELECT 1 FROM _migrations WHERE filename = :m"), {"m": m}).first():
+                print(f"Already applied: {m}")
+                continue
+            path = os.path.join(BASE_DIR, POSTGRES_MIGRATIONS_DIR, os.path.basename(m))
+            print(f"Running migration {path}")
+            with open(path, "r", encoding="utf-8") as f:
+                conn.exec_driver_sql(f.read())
+            conn.execute(text("INSERT INTO _migrations (filename) VALUES (:m)"), {"m": m})
+    engine.dispose()
+
 def drop():
+    if not DATABASE_URL.startswith("sqlite"):
+        print("drop only deletes the local SQLite file; drop a Postgres database with dropdb.")
+        return
     if os.path.exists(DB_PATH):
         os.remove(DB_PATH)
         print("Deleted database file:", DB_PATH)
@@ -66,6 +116,34 @@ def create_user_cli(username, password, email, display_name):
         db.session.commit()
         print(f"User {username} created successfully.")
 
+def refresh_hot_cli():
+    app = create_app()
+    with app.app_context():
+        count = refresh_hot_scores()
+    print(f"Refreshed hot_score for {count} posts.")
+
+def rebuild_leaderboards_cli():
+    app = create_app()
+    with app.app_context():
+        count = leaderboards.rebuild()
+    print(f"Rebuilt leaderboards: {count} entries.")
+
+def rebuild_conditions_cli():
+    app = create_app()
+    with app.app_context():
+        count = conditions.rebuild()
+    print(f"Rebuilt spot conditions: {count} daily rows.")
+
+def worker_cli(threads):
+    app = create_app()
+    print(f"Job worker running with {threads} thread(s); Ctrl+C to stop.")
+    jobs.run_workers(app, threads=threads)
+
+def maintain_cli(archive_likes_days, vacuum_pages, full_vacuum):
+    app = create_app()
+    with app.app_context():
+        maintenance.maintain(archive_likes_days, vacuum_pages, full_vacuum)
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(description="Manage DiveSpot API")
@@ -74,6 +152,15 @@ def main():
     sub.add_parser("migrate")
     sub.add_parser("drop")
     sub.add_parser("create-all")
+    sub.add_parser("refresh-hot", help="recompute hot_score for all posts (backfill)")
+    sub.add_parser("rebuild-leaderboards", help="recompute all leaderboard entries from dive posts")
+    sub.add_parser("rebuild-conditions", help="recompute daily spot conditions rollups from dive posts")
+    maintain_parser = sub.add_parser("maintain", help="ANALYZE, optimize, vacuum, checkpoint and archive old likes")
+    maintain_parser.add_argument("--archive-likes-days", type=int, default=None, help="move likes older than N days to post_likes_archive")
+    maintain_parser.add_argument("--vacuum-pages", type=int, default=0, help="max pages per incremental vacuum (0 = all free pages)")
+    maintain_parser.add_argument("--full-vacuum", action="store_true", help="rewrite the file once and switch to incremental auto_vacuum")
+    worker_parser = sub.add_parser("worker", help="run background job worker threads")
+    worker_parser.add_argument("--threads", type=int, default=2, help="number of worker threads")
     create_user_parser = sub.add_parser("create-user")
     create_user_parser.add_argument("username", help="Username for the new user")
     create_user_parser.add_argument("password", help="Password for the new user")
@@ -88,6 +175,16 @@ def main():
         drop()
     elif args.cmd == "create-all":
         create_tables_via_orm()
+    elif args.cmd == "refresh-hot":
+        refresh_hot_cli()
+    elif args.cmd == "rebuild-leaderboards":
+        rebuild_leaderboards_cli()
+    elif args.cmd == "rebuild-conditions":
+        rebuild_conditions_cli()
+    elif args.cmd == "maintain":
+        maintain_cli(args.archive_likes_days, args.vacuum_pages, args.full_vacuum)
+    elif args.cmd == "worker":
+        worker_cli(args.threads)
     elif args.cmd == "create-user":
         create_user_cli(args.username, args.password, args.email, args.display_name)
     else:
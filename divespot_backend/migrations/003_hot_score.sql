@@ -0,0 +1,4 @@
+-- Trending feed: stored hotness score, maintained on like/comment writes.
+-- Run `python manage.py refresh-hot` afterwards to backfill existing posts.
+ALTER TABLE dive_posts ADD COLUMN hot_score REAL DEFAULT 0;
+CREATE INDEX IF NOT EXISTS idx_dive_posts_hot_score ON dive_posts(hot_score);
@@ -0,0 +1,13 @@
+-- Leaderboards: one row per (board, scope, period, user), maintained on post writes.
+-- Run `python manage.py rebuild-leaderboards` afterwards to fill it from existing posts.
+CREATE TABLE IF NOT EXISTS leaderboard_entries (
+    board TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    period TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (board, scope, period, user_id),
+    FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS ix_leaderboard_rank ON leaderboard_entries(board, scope, period, value);
+CREATE INDEX IF NOT EXISTS idx_leaderboard_entries_user_id ON leaderboard_entries(user_id);
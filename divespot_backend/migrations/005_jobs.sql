@@ -0,0 +1,15 @@
+-- Durable background jobs (app/jobs.py, `python manage.py worker`)
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload JSON,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    run_after DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_by TEXT,
+    locked_at DATETIME,
+    last_error TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status_run_after ON jobs(status, run_after);
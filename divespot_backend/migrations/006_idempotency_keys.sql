@@ -0,0 +1,12 @@
+-- Idempotency-Key replay store (app/idempotency.py)
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    status_code INTEGER,
+    response_body TEXT,
+    claimed_at DATETIME,
+    expires_at DATETIME NOT NULL,
+    PRIMARY KEY (scope, key)
+);
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at ON idempotency_keys(expires_at);
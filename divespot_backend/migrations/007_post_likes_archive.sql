@@ -0,0 +1,11 @@
+-- Cold storage for old likes (`python manage.py maintain --archive-likes-days N`).
+-- WITHOUT ROWID + composite key: no uuid id column and no separate index.
+CREATE TABLE IF NOT EXISTS post_likes_archive (
+    post_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    created_at DATETIME,
+    PRIMARY KEY (post_id, user_id),
+    FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY(post_id) REFERENCES dive_posts(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_post_likes_archive_user_id ON post_likes_archive(user_id);
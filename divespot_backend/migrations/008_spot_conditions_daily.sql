@@ -0,0 +1,15 @@
+-- Daily per-spot conditions rollups (app/conditions.py), maintained on post writes.
+-- Run `python manage.py rebuild-conditions` afterwards to fill it from existing posts.
+CREATE TABLE IF NOT EXISTS spot_conditions_daily (
+    dive_spot_id TEXT NOT NULL,
+    day DATE NOT NULL,
+    dives INTEGER NOT NULL,
+    visibility_total INTEGER NOT NULL,
+    current_total INTEGER NOT NULL,
+    temp_dives INTEGER NOT NULL,
+    temp_total INTEGER,
+    temp_min INTEGER,
+    temp_max INTEGER,
+    PRIMARY KEY (dive_spot_id, day),
+    FOREIGN KEY(dive_spot_id) REFERENCES dive_spots(id) ON DELETE CASCADE
+) WITHOUT ROWID;
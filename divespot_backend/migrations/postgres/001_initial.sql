@@ -0,0 +1,124 @@
+-- Postgres version of ../001_initial.sql (DATABASE_URL=postgresql://...).
+-- ids stay text so the ORM's String(36) columns match on both backends.
+-- Counters are kept by the app (recalc_post_counts etc.), so unlike
+-- database/schema.sql there are no counter triggers here.
+
+-- Users
+CREATE TABLE IF NOT EXISTS users (
+    id VARCHAR(36) PRIMARY KEY,
+    username VARCHAR(50) NOT NULL UNIQUE,
+    email VARCHAR(255) NOT NULL UNIQUE,
+    display_name VARCHAR(100) NOT NULL,
+    bio TEXT,
+    profile_image_url TEXT,
+    location VARCHAR(100),
+    total_dives INTEGER DEFAULT 0,
+    max_depth_achieved INTEGER DEFAULT 0,
+    total_bottom_time INTEGER DEFAULT 0,
+    certification_level VARCHAR(50) DEFAULT 'Open Water',
+    favorite_spot_id VARCHAR(36),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_active_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    password_hash TEXT,
+    email_verified BOOLEAN DEFAULT FALSE
+);
+
+CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at);
+CREATE INDEX IF NOT EXISTS idx_users_search ON users USING GIN (to_tsvector('english', display_name || ' ' || username));
+
+-- Dive Spots
+CREATE TABLE IF NOT EXISTS dive_spots (
+    id VARCHAR(36) PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    description TEXT,
+    latitude DOUBLE PRECISION NOT NULL,
+    longitude DOUBLE PRECISION NOT NULL,
+    address TEXT,
+    max_depth INTEGER,
+    difficulty VARCHAR(15) NOT NULL CONSTRAINT ck_spot_difficulty CHECK (difficulty in ('Beginner','Intermediate','Advanced','Expert')),
+    water_type VARCHAR(15) NOT NULL DEFAULT 'Salt' CONSTRAINT ck_spot_watertype CHECK (water_type in ('Salt','Fresh','Brackish')),
+    avg_visibility INTEGER,
+    avg_temperature INTEGER,
+    created_by VARCHAR(36) NOT NULL REFERENCES users(id),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    total_dives_logged INTEGER DEFAULT 0,
+    avg_rating DOUBLE PRECISION DEFAULT 0.0
+);
+
+-- users <-> dive_spots reference each other, so this FK is added once both exist
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'fk_users_favorite_spot') THEN
+        ALTER TABLE users ADD CONSTRAINT fk_users_favorite_spot
+            FOREIGN KEY (favorite_spot_id) REFERENCES dive_spots(id);
+    END IF;
+END $$;
+
+CREATE INDEX IF NOT EXISTS idx_dive_spots_location ON dive_spots(latitude, longitude);
+CREATE INDEX IF NOT EXISTS idx_dive_spots_difficulty ON dive_spots(difficulty);
+CREATE INDEX IF NOT EXISTS idx_dive_spots_created_by ON dive_spots(created_by);
+CREATE INDEX IF NOT EXISTS idx_dive_spots_name ON dive_spots(name);
+CREATE INDEX IF NOT EXISTS idx_dive_spots_search ON dive_spots USING GIN (to_tsvector('english', name || ' ' || COALESCE(description, '')));
+
+-- Dive Posts
+CREATE TABLE IF NOT EXISTS dive_posts (
+    id VARCHAR(36) PRIMARY KEY,
+    user_id VARCHAR(36) NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    dive_spot_id VARCHAR(36) NOT NULL REFERENCES dive_spots(id),
+    caption TEXT,
+    image_urls JSONB,
+    dive_date DATE NOT NULL,
+    max_depth INTEGER NOT NULL,
+    dive_duration INTEGER NOT NULL,
+    visibility_quality VARCHAR(15) NOT NULL CONSTRAINT ck_post_visibility CHECK (visibility_quality in ('Excellent','Good','Fair','Poor','Very Poor')),
+    water_temp INTEGER,
+    wind_conditions VARCHAR(15) NOT NULL CONSTRAINT ck_post_wind CHECK (wind_conditions in ('Calm','Light','Moderate','Strong','Very Strong')),
+    current_conditions VARCHAR(15) NOT NULL CONSTRAINT ck_post_current CHECK (current_conditions in ('None','Light','Moderate','Strong','Very Strong')),
+    sea_life JSONB,
+    buddy_names JSONB,
+    equipment JSONB,
+    notes TEXT,
+    likes_count INTEGER DEFAULT 0,
+    comments_count INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    dive_timestamp TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_dive_posts_user_id ON dive_posts(user_id);
+CREATE INDEX IF NOT EXISTS idx_dive_posts_spot_id ON dive_posts(dive_spot_id);
+CREATE INDEX IF NOT EXISTS idx_dive_posts_created_at ON dive_posts(created_at);
+CREATE INDEX IF NOT EXISTS idx_dive_posts_dive_date ON dive_posts(dive_date);
+CREATE INDEX IF NOT EXISTS idx_dive_posts_visibility ON dive_posts(visibility_quality);
+CREATE INDEX IF NOT EXISTS idx_dive_posts_depth ON dive_posts(max_depth);
+CREATE INDEX IF NOT EXISTS idx_dive_posts_user_created ON dive_posts(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_dive_posts_spot_created ON dive_posts(dive_spot_id, created_at DESC);
+-- "which posts saw a whale shark": sea_life @> '["Whale Shark"]'
+CREATE INDEX IF NOT EXISTS idx_dive_posts_sea_life ON dive_posts USING GIN (sea_life jsonb_path_ops);
+
+-- Likes
+CREATE TABLE IF NOT EXISTS post_likes (
+    id VARCHAR(36) PRIMARY KEY,
+    user_id VARCHAR(36) NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    post_id VARCHAR(36) NOT NULL REFERENCES dive_posts(id) ON DELETE CASCADE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_like_user_post UNIQUE (user_id, post_id)
+);
+CREATE INDEX IF NOT EXISTS idx_post_likes_user_id ON post_likes(user_id);
+CREATE INDEX IF NOT EXISTS idx_post_likes_post_id ON post_likes(post_id);
+CREATE INDEX IF NOT EXISTS idx_post_likes_created_at ON post_likes(created_at);
+
+-- Comments
+CREATE TABLE IF NOT EXISTS post_comments (
+    id VARCHAR(36) PRIMARY KEY,
+    user_id VARCHAR(36) NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    post_id VARCHAR(36) NOT NULL REFERENCES dive_posts(id) ON DELETE CASCADE,
+    content TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_post_comments_user_id ON post_comments(user_id);
+CREATE INDEX IF NOT EXISTS idx_post_comments_post_id ON post_comments(post_id);
+CREATE INDEX IF NOT EXISTS idx_post_comments_created_at ON post_comments(created_at);
@@ -0,0 +1,12 @@
+-- Leaderboards: one row per (board, scope, period, user), maintained on post writes.
+-- Run `python manage.py rebuild-leaderboards` afterwards to fill it from existing posts.
+CREATE TABLE IF NOT EXISTS leaderboard_entries (
+    board VARCHAR(15) NOT NULL,
+    scope VARCHAR(36) NOT NULL,
+    period VARCHAR(7) NOT NULL,
+    user_id VARCHAR(36) NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (board, scope, period, user_id)
+);
+CREATE INDEX IF NOT EXISTS ix_leaderboard_rank ON leaderboard_entries(board, scope, period, value);
+CREATE INDEX IF NOT EXISTS idx_leaderboard_entries_user_id ON leaderboard_entries(user_id);
@@ -0,0 +1,15 @@
+-- Durable background jobs (app/jobs.py, `python manage.py worker`)
+CREATE TABLE IF NOT EXISTS jobs (
+    id SERIAL PRIMARY KEY,
+    kind VARCHAR(50) NOT NULL,
+    payload JSONB,
+    status VARCHAR(10) NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_by VARCHAR(64),
+    locked_at TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status_run_after ON jobs(status, run_after);
@@ -0,0 +1,12 @@
+-- Idempotency-Key replay store (app/idempotency.py)
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    scope VARCHAR(36) NOT NULL,
+    key VARCHAR(255) NOT NULL,
+    fingerprint VARCHAR(32) NOT NULL,
+    status_code INTEGER,
+    response_body TEXT,
+    claimed_at TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (scope, key)
+);
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at ON idempotency_keys(expires_at);
@@ -0,0 +1,9 @@
+-- Cold storage for old likes. `manage.py maintain` is SQLite-only, so on
+-- Postgres the table just exists for recalc_post_counts/purge_user to read.
+CREATE TABLE IF NOT EXISTS post_likes_archive (
+    post_id VARCHAR(36) NOT NULL REFERENCES dive_posts(id) ON DELETE CASCADE,
+    user_id VARCHAR(36) NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    created_at TIMESTAMP,
+    PRIMARY KEY (post_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_post_likes_archive_user_id ON post_likes_archive(user_id);
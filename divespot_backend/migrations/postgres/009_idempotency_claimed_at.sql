@@ -0,0 +1,3 @@
+-- Idempotency keys: when the in-flight request took the key, so a retry can
+-- take over a key whose request died (app/idempotency.py).
+ALTER TABLE idempotency_keys ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP;
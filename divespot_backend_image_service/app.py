@@ -1,6 +1,12 @@
 import os
+import re
+import json
+import time
+import hashlib
+import mimetypes
 import uuid
 from flask import Flask, request, jsonify, send_from_directory, abort
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import RequestEntityTooLarge
 from flask_cors import CORS
@@ -13,12 +19,31 @@ CORS(app=app)
 UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "uploads")
 MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", 10 * 1024 * 1024))  # 10 MB
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
+# How /files is served:
+#   "direct"     - Flask streams the file (wsgi.file_wrapper / sendfile where the server has it)
+#   "x-sendfile" - X-Sendfile header for Apache/lighttpd to serve the file
+#   "x-accel"    - X-Accel-Redirect to an nginx `internal` location mapped to UPLOAD_FOLDER
+SERVE_MODE = os.getenv("SERVE_MODE", "direct")
+ACCEL_REDIRECT_PREFIX = os.getenv("ACCEL_REDIRECT_PREFIX", "/protected-uploads/")
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Uploaded names are random hex and never reused, so the bytes behind a name never change
+CONTENT_NAME_RE = re.compile(r"^(?P<key>[0-9a-f]{32,64})\.[a-z0-9]+$")
+
+# Resumable uploads: total size cap, and how long an unfinished upload is kept
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 50 * 1024 * 1024))  # 50 MB
+UPLOAD_EXPIRY_SECONDS = int(os.getenv("UPLOAD_EXPIRY_SECONDS", 24 * 3600))
+STREAM_BUFFER_SIZE = 64 * 1024
+# Partial files live under UPLOAD_FOLDER so finalize is a same-filesystem os.replace
+PARTIAL_FOLDER = os.path.join(UPLOAD_FOLDER, ".partial")
+UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
 
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.config["MAX_CONTENT_LENGTH"] = MAX_CONTENT_LENGTH
+app.config["USE_X_SENDFILE"] = SERVE_MODE == "x-sendfile"
 
 # Ensure upload folder exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+os.makedirs(PARTIAL_FOLDER, exist_ok=True)
 
 
 def allowed_file(filename: str) -> bool:
@@ -58,12 +83,221 @@ def upload_file():
     return jsonify({"error": "Invalid file type"}), 400
 
 
+# ----------- Resumable uploads -----------
+#
+#   POST /uploads                    {"filename", "size"}      -> {"upload_id", "offset": 0}
+#   PUT  /uploads/<id>?offset=N      raw bytes of the next chunk -> {"offset"}
+#   GET  /uploads/<id>                                          -> {"offset", "size"} (resume point)
+#   POST /uploads/<id>/complete      {"sha256"}                 -> {"file_url"}
+#
+# State is just the partial file and a small JSON sidecar on disk, so any
+# worker can take any chunk and an interrupted client resumes from "offset".
+
+def partial_paths(upload_id: str):
+    if not UPLOAD_ID_RE.match(upload_id):
+        abort(404, description="Upload not found")
+    base = os.path.join(PARTIAL_FOLDER, upload_id)
+    return base + ".part", base + ".json"
+
+
+def load_upload(upload_id: str):
+    part_path, meta_path = partial_paths(upload_id)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        abort(404, description="Upload not found")
+    return meta, part_path, meta_path
+
+
+def part_size(part_path: str) -> int:
+    # the .part can go between reading the sidecar and here: a racing
+    # complete/expire, or a .json left behind by one that was interrupted
+    try:
+        return os.path.getsize(part_path)
+    except FileNotFoundError:
+        abort(404, description="Upload not found")
+
+
+def remove_if_present(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def expire_stale_uploads():
+    # An upload is a .part/.json pair. Chunks only touch the .part, so its
+    # mtime is when the upload was last active; the pair goes together, or a
+    # live upload could lose its sidecar. A lone file is left over from a
+    # half-finished complete/expire and goes by its own mtime.
+    cutoff = time.time() - UPLOAD_EXPIRY_SECONDS
+    upload_ids = {name.rsplit(".", 1)[0] for name in os.listdir(PARTIAL_FOLDER)}
+    for upload_id in upload_ids:
+        if not UPLOAD_ID_RE.match(upload_id):
+            continue
+        part_path, meta_path = partial_paths(upload_id)
+        last_active = None
+        for path in (part_path, meta_path):
+            try:
+                last_active = os.path.getmtime(path)
+                break
+            except OSError:
+                continue
+        if last_active is None or last_active >= cutoff:
+            continue
+        for path in (part_path, meta_path):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+
+
+@app.route("/uploads", methods=["POST"])
+def init_upload():
+    data = request.get_json(silent=True) or {}
+    filename = data.get("filename") or ""
+    size = data.get("size")
+    if not allowed_file(filename):
+        return jsonify({"error": "Invalid file type"}), 400
+    if not isinstance(size, int) or size <= 0:
+        return jsonify({"error": "size must be a positive integer"}), 400
+    if size > MAX_UPLOAD_SIZE:
+        return jsonify({"error": "File too large"}), 413
+
+    expire_stale_uploads()
+    upload_id = uuid.uuid4().hex
+    part_path, meta_path = partial_paths(upload_id)
+    open(part_path, "wb").close()
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"ext": filename.rsplit(".", 1)[1].lower(), "size": size}, f)
+    return jsonify({"upload_id": upload_id, "offset": 0, "size": size}), 201
+
+
+@app.route("/uploads/<upload_id>", methods=["GET"])
+def upload_status(upload_id):
+    meta, part_path, _ = load_upload(upload_id)
+    return jsonify({"upload_id": upload_id, "offset": part_size(part_path), "size": meta["size"]})
+
+
+@app.route("/uploads/<upload_id>", methods=["PUT"])
+def upload_chunk(upload_id):
+    meta, part_path, _ = load_upload(upload_id)
+    current = part_size(part_path)
+    try:
+        offset = int(request.args.get("offset", request.headers.get("Upload-Offset", "")))
+    except ValueError:
+        return jsonify({"error": "offset required"}), 400
+    if offset != current:
+        # the client is out of sync (e.g. a lost response); tell it where to resume
+        return jsonify({"error": "offset mismatch", "offset": current}), 409
+
+    length = request.content_length
+    if length is None:
+        return jsonify({"error": "Content-Length required"}), 411
+    if current + length > meta["size"]:
+        return jsonify({"error": "chunk exceeds declared size", "offset": current}), 400
+
+    # copy the raw body straight into the partial file; no form parsing or spooling
+    try:
+        f = open(part_path, "r+b")
+    except FileNotFoundError:
+        abort(404, description="Upload not found")
+    with f:
+        f.seek(offset)
+        while True:
+            buf = request.stream.read(STREAM_BUFFER_SIZE)
+            if not buf:
+                break
+            f.write(buf)
+        f.truncate()
+        written = f.tell()
+    return jsonify({"upload_id": upload_id, "offset": written, "size": meta["size"]})
+
+
+@app.route("/uploads/<upload_id>/complete", methods=["POST"])
+def complete_upload(upload_id):
+    meta, part_path, meta_path = load_upload(upload_id)
+    data = request.get_json(silent=True) or {}
+    expected = (data.get("sha256") or "").lower()
+    if not expected:
+        return jsonify({"error": "sha256 required"}), 400
+
+    size = part_size(part_path)
+    if size != meta["size"]:
+        return jsonify({"error": "upload incomplete", "offset": size}), 409
+
+    # a second finalize retry can be racing this one; whichever moves the
+    # .part first wins and the other answers 404
+    digest = hashlib.sha256()
+    try:
+        with open(part_path, "rb") as f:
+            for buf in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(buf)
+    except FileNotFoundError:
+        abort(404, description="Upload not found")
+    if digest.hexdigest() != expected:
+        # corrupt data somewhere; start over rather than guess which chunk
+        remove_if_present(part_path)
+        remove_if_present(meta_path)
+        return jsonify({"error": "checksum mismatch"}), 422
+
+    safe_name = secure_filename(f"{uuid.uuid4().hex}.{meta['ext']}")
+    try:
+        os.replace(part_path, os.path.join(app.config["UPLOAD_FOLDER"], safe_name))
+    except FileNotFoundError:
+        abort(404, description="Upload not found")
+    remove_if_present(meta_path)
+    return jsonify({
+        "message": "File uploaded successfully",
+        "file_url": f"/files/{safe_name}"
+    }), 201
+
+
 @app.route("/files/<path:filename>")
 def uploaded_file(filename):
+    if any(part.startswith(".") for part in filename.split("/")):
+        # hidden entries, including unfinished uploads in .partial/
+        abort(404, description="File not found")
+    match = CONTENT_NAME_RE.match(filename)
+    if SERVE_MODE == "x-accel":
+        return accel_redirect(filename, match)
     try:
-        return send_from_directory(app.config["UPLOAD_FOLDER"], filename)
+        # conditional=True gives 304s and Range/206 handling
+        response = send_from_directory(
+            app.config["UPLOAD_FOLDER"],
+            filename,
+            conditional=True,
+            etag=match.group("key") if match else True,
+            max_age=IMMUTABLE_MAX_AGE if match else None,
+        )
     except FileNotFoundError:
         abort(404, description="File not found")
+    return with_cache_headers(response, match)
+
+
+def with_cache_headers(response, match):
+    response.headers["Accept-Ranges"] = "bytes"
+    if match:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    return response
+
+
+def accel_redirect(filename, match):
+    """Hand the transfer (including Range requests) to nginx; only headers leave Python."""
+    path = safe_join(app.config["UPLOAD_FOLDER"], filename)
+    if path is None or not os.path.isfile(path):
+        abort(404, description="File not found")
+    response = app.response_class()
+    response.headers["X-Accel-Redirect"] = ACCEL_REDIRECT_PREFIX + filename
+    response.content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    if match:
+        response.set_etag(match.group("key"))
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    # answers If-None-Match with 304 before nginx is involved
+    response.make_conditional(request)
+    return with_cache_headers(response, match)
 
 
 if __name__ == "__main__":